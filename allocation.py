@@ -0,0 +1,114 @@
+"""Allocation of the shared monthly costs across a catalog of products.
+
+The calculator's labor, sales, utility and cleaning costs are grouped into
+pools. Each pool is split across the SKUs according to a driver: volume
+(units), weight (kg) or labor hours. An allocation scenario assigns one
+driver per pool. All SKUs and scenarios are evaluated in one einsum over a
+(scenario × pool × driver) assignment tensor and the (driver × SKU) share
+matrix. Raw material, cutting and packaging stay direct per-unit costs of
+each SKU.
+"""
+from itertools import product
+
+import numpy as np
+
+# Shared cost pools and the calculator inputs that feed them
+POOLS = {
+    'mano_de_obra': ('sueldo1', 'trabajador_adicional'),
+    'ventas': ('empleado_ventas', 'redes_sociales'),
+    'servicios': ('luz', 'agua', 'fumigacion'),
+    'limpieza': ('liquidos_limpieza', 'otro_liquido'),
+}
+POOL_LABELS = {
+    'mano_de_obra': "Mano de obra",
+    'ventas': "Ventas y redes",
+    'servicios': "Servicios",
+    'limpieza': "Limpieza",
+}
+
+DRIVERS = ('volumen', 'peso', 'horas')
+DRIVER_LABELS = {'volumen': "Volumen (bolsas)", 'peso': "Peso (kg)", 'horas': "Horas de mano de obra"}
+
+# Per-SKU columns: price, monthly units, kg and labor hours per unit, direct cost per unit
+SKU_FIELDS = ('precio', 'unidades', 'peso_kg', 'horas', 'costo_directo')
+
+
+def pool_amounts(inputs):
+    """Monthly amount of each shared pool, in POOLS order."""
+    return np.array([sum(float(inputs[field]) for field in fields) for fields in POOLS.values()])
+
+
+def _driver_totals(skus):
+    unidades = np.asarray(skus['unidades'], dtype=np.float64)
+    return np.stack([
+        unidades,
+        unidades * np.asarray(skus['peso_kg'], dtype=np.float64),
+        unidades * np.asarray(skus['horas'], dtype=np.float64),
+    ])
+
+
+def driver_shares(skus):
+    """(driver × SKU) matrix with each SKU's share of every driver's total.
+
+    A driver whose total is 0 has no shares at all: there are no units to
+    carry a cost split by it (see ``sin_asignar`` in allocate()).
+    """
+    totals = _driver_totals(skus)
+    suma = totals.sum(axis=1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(suma > 0, totals / suma, 0.0)
+
+
+def assignment(scenarios):
+    """One-hot (scenario × pool × driver) tensor from pool -> driver mappings."""
+    tensor = np.zeros((len(scenarios), len(POOLS), len(DRIVERS)))
+    for s, scenario in enumerate(scenarios):
+        for p, pool in enumerate(POOLS):
+            tensor[s, p, DRIVERS.index(scenario[pool])] = 1.0
+    return tensor
+
+
+def all_scenarios():
+    """Every combination of one driver per pool."""
+    return [dict(zip(POOLS, drivers)) for drivers in product(DRIVERS, repeat=len(POOLS))]
+
+
+def allocate(fondos, skus, scenarios):
+    """Per-SKU cost and margin for every allocation scenario.
+
+    ``fondos`` holds the monthly amount of each pool in POOLS order (see
+    pool_amounts). ``skus`` maps each of SKU_FIELDS to a sequence with one
+    value per SKU. Returns (scenario × SKU) arrays: ``costo_asignado``
+    (shared costs charged to the SKU per month), ``costo_unitario``,
+    ``utilidad_unitaria``, ``utilidad_total`` and ``margen`` (% of price, 0
+    where the price is 0), plus ``por_fondo`` with the (scenario × pool ×
+    SKU) breakdown.
+
+    ``sin_asignar`` is a (scenario × pool) array with the amount of each pool
+    that no SKU carries because the pool's driver totals 0, e.g. a split by
+    weight with no kg per unit. Where it isn't 0, that scenario's costs leave
+    the amount out and its margins are overstated.
+    """
+    precio = np.asarray(skus['precio'], dtype=np.float64)
+    unidades = np.asarray(skus['unidades'], dtype=np.float64)
+    directo = np.asarray(skus['costo_directo'], dtype=np.float64)
+
+    fondos = np.asarray(fondos, dtype=np.float64)
+    asignacion = assignment(scenarios)
+    por_fondo = np.einsum('p,spd,dk->spk', fondos, asignacion, driver_shares(skus))
+    sin_driver = (_driver_totals(skus).sum(axis=1) <= 0).astype(np.float64)
+    sin_asignar = np.einsum('p,spd,d->sp', fondos, asignacion, sin_driver)
+    costo_asignado = por_fondo.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        costo_unitario = directo + np.where(unidades > 0, costo_asignado / unidades, 0.0)
+        utilidad_unitaria = precio - costo_unitario
+        margen = np.where(precio != 0, utilidad_unitaria / precio * 100, 0.0)
+    return {
+        'costo_asignado': costo_asignado,
+        'costo_unitario': costo_unitario,
+        'utilidad_unitaria': utilidad_unitaria,
+        'utilidad_total': utilidad_unitaria * unidades,
+        'margen': margen,
+        'por_fondo': por_fondo,
+        'sin_asignar': sin_asignar,
+    }
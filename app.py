@@ -1,116 +1,102 @@
-import streamlit as st
-import matplotlib.pyplot as plt
-import numpy as np
+import os
 import sqlite3
-from datetime import datetime
-import pandas as pd
-
-# ----------------- DATABASE SETUP -----------------
-def init_database():
-    """Initialize the SQLite database and create tables if they don't exist."""
-    conn = sqlite3.connect('machaca_calculator.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS calculation_versions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            version_name TEXT NOT NULL,
-            created_date TEXT NOT NULL,
-            carne_fresca REAL,
-            sal REAL,
-            sueldo1 REAL,
-            trabajador_adicional REAL,
-            empleado_ventas REAL,
-            redes_sociales REAL,
-            corte_carne REAL,
-            luz REAL,
-            agua REAL,
-            fumigacion REAL,
-            liquidos_limpieza REAL,
-            otro_liquido REAL,
-            total_unidades INTEGER,
-            precio_venta REAL,
-            precio_venta_sugerido REAL
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
+import tempfile
+import time
+import uuid
+import weakref
 
-def save_calculation(version_name, data):
-    """Save a calculation version to the database."""
-    conn = sqlite3.connect('machaca_calculator.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        INSERT INTO calculation_versions (
-            version_name, created_date, carne_fresca, sal, sueldo1,
-            trabajador_adicional, empleado_ventas, redes_sociales, corte_carne, luz, agua, fumigacion,
-            liquidos_limpieza, otro_liquido, total_unidades,
-            precio_venta, precio_venta_sugerido
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (
-        version_name,
-        datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        data['carne_fresca'],
-        data['sal'],
-        data['sueldo1'],
-        data['trabajador_adicional'],
-        data['empleado_ventas'],
-        data['redes_sociales'],
-        data['corte_carne'],
-        data['luz'],
-        data['agua'],
-        data['fumigacion'],
-        data['liquidos_limpieza'],
-        data['otro_liquido'],
-        data['total_unidades'],
-        data['precio_venta'],
-        data['precio_venta_sugerido']
-    ))
-    
-    conn.commit()
-    conn.close()
+import streamlit as st
 
-def get_all_versions():
-    """Get all saved calculation versions."""
-    conn = sqlite3.connect('machaca_calculator.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT id, version_name, created_date FROM calculation_versions
-        ORDER BY created_date DESC
-    ''')
-    
-    versions = cursor.fetchall()
-    conn.close()
-    return versions
-
-def get_version_data(version_id):
-    """Get data for a specific version."""
-    conn = sqlite3.connect('machaca_calculator.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT * FROM calculation_versions WHERE id = ?
-    ''', (version_id,))
-    
-    version_data = cursor.fetchone()
-    conn.close()
-    return version_data
-
-def delete_version(version_id):
-    """Delete a specific version."""
-    conn = sqlite3.connect('machaca_calculator.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('DELETE FROM calculation_versions WHERE id = ?', (version_id,))
-    
-    conn.commit()
-    conn.close()
+from profiling import ENABLED as PROFILE_ENABLED, start_rerun
+from startup import REPORT_ENABLED, record_run, timed_imports
+
+_run_start = time.perf_counter()
+
+with timed_imports('database'):
+    from database import (
+        PAGE_COLUMNS,
+        PAGE_SIZE,
+        SEARCH_COLUMNS,
+        SORT_COLUMNS,
+        STORED_METRICS,
+        count_versions,
+        export_versions,
+        get_all_version_inputs,
+        get_connection,
+        get_version_data,
+        get_versions_page,
+        import_versions,
+        search_versions,
+        submit_delete,
+        submit_save,
+        version_stats,
+    )
+
+# Seconds a save or delete waits for the writer's acknowledgement
+WRITE_TIMEOUT = 10
+
+# numpy, pandas and matplotlib are imported in the page or section that needs
+# them, so a session that never opens those sections never pays for them.
 
-# Initialize database
-init_database()
+# ----------------- CACHED COMPUTATIONS -----------------
+# cache_resource hands out the cached arrays themselves instead of unpickling
+# a copy of grids up to 11 × 500 × 500 on every rerun; they are read-only.
+@st.cache_resource(max_entries=3, show_spinner=False)
+def cached_sensitivity_grid(inputs, precio_range, unidades_range, resolucion, carne_range=None, carne_niveles=0):
+    """Evaluate the price × volume grid once per distinct set of parameters."""
+    import numpy as np
+    from calculator import sensitivity_grid
+
+    precios = np.linspace(precio_range[0], precio_range[1], resolucion)
+    unidades = np.linspace(unidades_range[0], unidades_range[1], resolucion)
+    carnes = np.linspace(carne_range[0], carne_range[1], carne_niveles) if carne_range else None
+    utilidad_total, utilidad_pct = sensitivity_grid(dict(inputs), precios, unidades, carnes)
+    resultado = (precios, unidades, carnes, utilidad_total, utilidad_pct)
+    for array in resultado:
+        if array is not None:
+            array.setflags(write=False)
+    return resultado
+
+@st.cache_data(max_entries=16, show_spinner="Simulando escenarios...")
+def cached_simulation(inputs, distributions, n_samples, seed):
+    """Run the Monte Carlo simulation once per distinct inputs, distributions and seed."""
+    import simulation
+
+    return simulation.simulate(dict(inputs), distributions, n_samples=n_samples, seed=seed)
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def cached_price_optimization(inputs, precio_range, candidatos, demanda, variable_fields):
+    """Search the profit-maximizing price once per distinct inputs and demand curve."""
+    import numpy as np
+    import pricing
+
+    precios = np.linspace(precio_range[0], precio_range[1], candidatos)
+    return pricing.optimize_price(dict(inputs), precios, *demanda, variable_fields=variable_fields)
+
+# ----------------- SESSION FILES -----------------
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+class SessionFile:
+    """Temporary file kept in st.session_state for a download button.
+
+    The file is deleted by remove(), or when the object is garbage collected
+    once Streamlit drops the state of an ended session, or at exit.
+    """
+
+    def __init__(self, suffix):
+        destino = tempfile.NamedTemporaryFile(suffix=suffix, delete=False)
+        destino.close()
+        self.name = destino.name
+        self.remove = weakref.finalize(self, _remove_file, self.name)
+
+    def read(self):
+        """The file's bytes; passed as a download button's data, it runs only on click."""
+        with open(self.name, "rb") as archivo:
+            return archivo.read()
 
 # ----------------- CONFIG -----------------
 st.set_page_config(
@@ -158,10 +144,35 @@ st.markdown(
     unsafe_allow_html=True,
 )
 
+# ----------------- PROFILING -----------------
+if PROFILE_ENABLED and 'profile_session' not in st.session_state:
+    st.session_state.profile_session = uuid.uuid4().hex[:8]
+perfil = start_rerun(st.session_state.get('profile_session'))
+
+# Opens the shared connection and runs pending migrations on a worker's first run
+with perfil.section('db.init'):
+    get_connection()
+
 # ----------------- PAGE NAVIGATION -----------------
-page = st.sidebar.selectbox("📋 Navegación", ["Calculadora Principal", "Versiones Guardadas"])
+page = st.sidebar.selectbox("📋 Navegación", ["Calculadora Principal", "Versiones Guardadas", "Tendencias", "Multi-Producto"])
 
 if page == "Calculadora Principal":
+    with timed_imports('numpy'):
+        import numpy as np
+    with timed_imports('calculator'):
+        from calculator import (
+            COSTO_UNITARIO_EMPAQUE,
+            COST_FIELDS,
+            EMPTY_INPUTS,
+            INPUT_FIELDS,
+            INPUT_LABELS,
+            InputRecord,
+            price_for_margin,
+        )
+        from graph import CALCULATOR
+    with timed_imports('autosave'):
+        import autosave
+
     # ----------------- INITIALIZE SESSION STATE DEFAULTS -----------------
     # Initialize session state with default values if not already set
     if 'initialized' not in st.session_state:
@@ -182,93 +193,37 @@ if page == "Calculadora Principal":
         st.session_state.precio_venta = 145.18
         st.session_state.precio_venta_sugerido = 196.00
 
+    # ----------------- AUTOSAVED DRAFT -----------------
+    # The draft key lives in the URL, so reopening it after a dropped session restores the inputs
+    if 'draft_key' not in st.session_state:
+        st.session_state.draft_key = st.query_params.get('draft') or uuid.uuid4().hex
+        st.query_params['draft'] = st.session_state.draft_key
+        with perfil.section('borrador.restaurar'):
+            borrador = autosave.load_draft(st.session_state.draft_key)
+        if borrador is not None:
+            st.session_state.update(InputRecord.from_mapping(borrador))
+            st.toast("📝 Borrador restaurado")
+
+    # Memoized formulas and charts; only nodes whose inputs changed are recomputed
+    if 'grafo' not in st.session_state:
+        st.session_state.grafo = CALCULATOR.evaluation()
+    grafo = st.session_state.grafo
+    grafo.start_run()
+
     # ----------------- LOAD VERSION DATA IF SELECTED -----------------
-    if 'load_version_data' in st.session_state and st.session_state.load_version_data:
-        version_data = st.session_state.load_version_data
-        # Set session state values from loaded data
-        st.session_state.carne_fresca = version_data[3]
-        st.session_state.sal = version_data[4]
-        st.session_state.sueldo1 = version_data[5]
-        st.session_state.trabajador_adicional = version_data[6]
+    with perfil.section('hidratacion'):
+        if 'load_version_data' in st.session_state and st.session_state.load_version_data:
+            # Set session state values from loaded data
+            st.session_state.update(InputRecord.from_mapping(st.session_state.load_version_data))
         
-        # Handle new fields for older versions
-        if len(version_data) > 7:
-            st.session_state.empleado_ventas = version_data[7]
-        else:
-            st.session_state.empleado_ventas = 0.0
-            
-        if len(version_data) > 8:
-            st.session_state.redes_sociales = version_data[8]
-        else:
-            st.session_state.redes_sociales = 0.0
-            
-        if len(version_data) > 9:
-            st.session_state.corte_carne = version_data[9]
-        else:
-            st.session_state.corte_carne = version_data[7] if len(version_data) > 7 else 0.0
-            
-        if len(version_data) > 10:
-            st.session_state.luz = version_data[10]
-        else:
-            st.session_state.luz = version_data[8] if len(version_data) > 8 else 0.0
-            
-        if len(version_data) > 11:
-            st.session_state.agua = version_data[11]
-        else:
-            st.session_state.agua = version_data[9] if len(version_data) > 9 else 0.0
-            
-        if len(version_data) > 12:
-            st.session_state.fumigacion = version_data[12]
-        else:
-            st.session_state.fumigacion = version_data[10] if len(version_data) > 10 else 0.0
-            
-        if len(version_data) > 13:
-            st.session_state.liquidos_limpieza = version_data[13]
-        else:
-            st.session_state.liquidos_limpieza = version_data[11] if len(version_data) > 11 else 0.0
-            
-        if len(version_data) > 14:
-            st.session_state.otro_liquido = version_data[14]
-        else:
-            st.session_state.otro_liquido = version_data[12] if len(version_data) > 12 else 0.0
-            
-        if len(version_data) > 15:
-            st.session_state.total_unidades = version_data[15]
-        else:
-            st.session_state.total_unidades = version_data[13] if len(version_data) > 13 else 1
-            
-        if len(version_data) > 16:
-            st.session_state.precio_venta = version_data[16]
-        else:
-            st.session_state.precio_venta = version_data[14] if len(version_data) > 14 else 0.0
-            
-        if len(version_data) > 17:
-            st.session_state.precio_venta_sugerido = version_data[17]
-        else:
-            st.session_state.precio_venta_sugerido = version_data[15] if len(version_data) > 15 else 0.0
-        
-        # Clear the session state
-        st.session_state.load_version_data = None
-    elif 'reset_values' in st.session_state and st.session_state.reset_values:
-        # Set all values to zero for reset
-        st.session_state.carne_fresca = 0.0
-        st.session_state.sal = 0.0
-        st.session_state.sueldo1 = 0.0
-        st.session_state.trabajador_adicional = 0.0
-        st.session_state.empleado_ventas = 0.0
-        st.session_state.redes_sociales = 0.0
-        st.session_state.corte_carne = 0.0
-        st.session_state.luz = 0.0
-        st.session_state.agua = 0.0
-        st.session_state.fumigacion = 0.0
-        st.session_state.liquidos_limpieza = 0.0
-        st.session_state.otro_liquido = 0.0
-        st.session_state.total_unidades = 1
-        st.session_state.precio_venta = 0.0
-        st.session_state.precio_venta_sugerido = 0.0
+            # Clear the session state
+            st.session_state.load_version_data = None
+        elif 'reset_values' in st.session_state and st.session_state.reset_values:
+            # Set all values to zero for reset
+            st.session_state.update(EMPTY_INPUTS)
         
-        # Clear the reset flag
-        st.session_state.reset_values = False
+            # Clear the reset flag
+            st.session_state.reset_values = False
 
     # ----------------- SIDEBAR INPUTS -----------------
     st.sidebar.header("🛠 Ajustes de Costos & Ventas")
@@ -298,17 +253,11 @@ if page == "Calculadora Principal":
     st.sidebar.subheader("🛒 Producción & Ventas")
     st.session_state.total_unidades = st.sidebar.number_input("Bolsas producidas", min_value=1, value=int(st.session_state.total_unidades), step=1)
     
-    # Calculate cost per bag first for margin calculations using session state values
-    costo_unitario_empaque = 2.0
-    empaques = st.session_state.total_unidades * costo_unitario_empaque
-    costo_total_temp = (
-        st.session_state.carne_fresca + st.session_state.sal + st.session_state.corte_carne +
-        st.session_state.sueldo1 + st.session_state.trabajador_adicional + st.session_state.empleado_ventas + st.session_state.redes_sociales +
-        st.session_state.luz + st.session_state.agua + st.session_state.fumigacion +
-        st.session_state.liquidos_limpieza + st.session_state.otro_liquido +
-        empaques
-    )
-    costo_por_bolsa_temp = costo_total_temp / st.session_state.total_unidades
+    # Costs don't depend on the price, so compute them once for the margin controls and the results
+    with perfil.section('calculos.costos'):
+        grafo.update(InputRecord.from_mapping(st.session_state))
+        costos = grafo.get('costos')
+    costo_por_bolsa_temp = costos['costo_por_bolsa']
     
     # Price/Margin control options
     precio_control = st.sidebar.radio(
@@ -321,9 +270,10 @@ if page == "Calculadora Principal":
     st.sidebar.markdown("**💰 Precio Actual**")
     if precio_control == "Por Precio":
         st.session_state.precio_venta = st.sidebar.number_input("Precio actual por bolsa ($)", min_value=0.0, value=float(st.session_state.precio_venta), step=1.0)
+        grafo.set('precio_venta', st.session_state.precio_venta)
         # Calculate and display margin
         if st.session_state.precio_venta > 0:
-            margen_calculado = ((st.session_state.precio_venta - costo_por_bolsa_temp) / st.session_state.precio_venta) * 100
+            margen_calculado = grafo.get('margen_actual')
             if margen_calculado >= 0:
                 st.sidebar.info(f"📊 Margen actual: {margen_calculado:.1f}%")
             else:
@@ -334,7 +284,7 @@ if page == "Calculadora Principal":
         # Control by margin
         # Calculate current margin for default value, but handle negative margins
         if st.session_state.precio_venta > 0:
-            current_margin = ((st.session_state.precio_venta - costo_por_bolsa_temp) / st.session_state.precio_venta * 100)
+            current_margin = grafo.get('margen_actual')
             # Ensure the margin is not negative for the number input
             current_margin = max(0.0, current_margin)
         else:
@@ -350,16 +300,14 @@ if page == "Calculadora Principal":
         )
         
         # Calculate price based on margin
-        if margen_deseado < 95:  # Avoid division by zero/negative issues
-            st.session_state.precio_venta = costo_por_bolsa_temp / (1 - margen_deseado/100)
-        else:
-            st.session_state.precio_venta = costo_por_bolsa_temp * 20  # Fallback for high margins
+        st.session_state.precio_venta = float(price_for_margin(margen_deseado, costo_por_bolsa_temp))
+        grafo.set('precio_venta', st.session_state.precio_venta)
         
         st.sidebar.info(f"💰 Precio calculado: ${st.session_state.precio_venta:.2f}")
         
         # Show warning if original margin was negative
         if st.session_state.precio_venta > 0:
-            original_margin = ((st.session_state.precio_venta - costo_por_bolsa_temp) / st.session_state.precio_venta * 100)
+            original_margin = grafo.get('margen_actual')
             if original_margin < 0:
                 st.sidebar.warning(f"⚠️ Nota: El precio original tenía un margen negativo de {original_margin:.1f}%")
 
@@ -367,9 +315,10 @@ if page == "Calculadora Principal":
     st.sidebar.markdown("**✨ Precio Sugerido**")
     if precio_control == "Por Precio":
         st.session_state.precio_venta_sugerido = st.sidebar.number_input("Precio sugerido por bolsa ($)", min_value=0.0, value=float(st.session_state.precio_venta_sugerido), step=1.0)
+        grafo.set('precio_venta_sugerido', st.session_state.precio_venta_sugerido)
         # Calculate and display margin for suggested price
         if st.session_state.precio_venta_sugerido > 0:
-            margen_calculado_sug = ((st.session_state.precio_venta_sugerido - costo_por_bolsa_temp) / st.session_state.precio_venta_sugerido) * 100
+            margen_calculado_sug = grafo.get('margen_sugerido')
             if margen_calculado_sug >= 0:
                 st.sidebar.info(f"📊 Margen sugerido: {margen_calculado_sug:.1f}%")
             else:
@@ -380,7 +329,7 @@ if page == "Calculadora Principal":
         # Control by margin for suggested price
         # Calculate current margin for default value, but handle negative margins
         if st.session_state.precio_venta_sugerido > 0:
-            current_margin_sug = ((st.session_state.precio_venta_sugerido - costo_por_bolsa_temp) / st.session_state.precio_venta_sugerido * 100)
+            current_margin_sug = grafo.get('margen_sugerido')
             # Ensure the margin is not negative for the number input
             current_margin_sug = max(0.0, current_margin_sug)
         else:
@@ -396,20 +345,21 @@ if page == "Calculadora Principal":
         )
         
         # Calculate suggested price based on margin
-        if margen_deseado_sug < 95:  # Avoid division by zero/negative issues
-            st.session_state.precio_venta_sugerido = costo_por_bolsa_temp / (1 - margen_deseado_sug/100)
-        else:
-            st.session_state.precio_venta_sugerido = costo_por_bolsa_temp * 20  # Fallback for high margins
+        st.session_state.precio_venta_sugerido = float(price_for_margin(margen_deseado_sug, costo_por_bolsa_temp))
+        grafo.set('precio_venta_sugerido', st.session_state.precio_venta_sugerido)
         
         st.sidebar.info(f"✨ Precio sugerido calculado: ${st.session_state.precio_venta_sugerido:.2f}")
         
         # Show warning if original suggested margin was negative
         if st.session_state.precio_venta_sugerido > 0:
-            original_margin_sug = ((st.session_state.precio_venta_sugerido - costo_por_bolsa_temp) / st.session_state.precio_venta_sugerido * 100)
+            original_margin_sug = grafo.get('margen_sugerido')
             if original_margin_sug < 0:
                 st.sidebar.warning(f"⚠️ Nota: El precio sugerido original tenía un margen negativo de {original_margin_sug:.1f}%")
     
-    # Session state already updated by inputs
+    # Every input is final from here on; the rest of the page reads this record
+    registro = InputRecord.from_mapping(st.session_state)
+    # Queue them for the debounced autosave
+    autosave.submit(st.session_state.draft_key, registro)
 
     # ----------------- MAIN LAYOUT -----------------
     st.title("🐮 La Vaquita Feliz")
@@ -436,6 +386,45 @@ if page == "Calculadora Principal":
         
         st.markdown("---")
 
+    # ----------------- NEXT-MONTH FORECAST -----------------
+    # Reads every version on first use, so it only runs when asked for
+    if st.checkbox("🔮 Mostrar pronóstico del próximo mes"):
+        with timed_imports('forecast'):
+            from forecast import HALF_LIFE_MONTHS, get_forecast
+
+        with perfil.section('pronostico'):
+            pronostico = get_forecast().predict()
+        if not pronostico:
+            st.info("📝 Guarda al menos una versión para pronosticar el próximo mes.")
+        else:
+            st.dataframe(
+                [
+                    {
+                        "Valor": INPUT_LABELS[field],
+                        "Última versión": ultimo,
+                        "Pronóstico": valor,
+                        "Mínimo (95%)": bajo,
+                        "Máximo (95%)": alto,
+                    }
+                    for field, (ultimo, valor, bajo, alto) in pronostico.items()
+                ],
+                hide_index=True,
+                column_config={
+                    "Última versión": st.column_config.NumberColumn(format="%.2f"),
+                    "Pronóstico": st.column_config.NumberColumn(format="%.2f"),
+                    "Mínimo (95%)": st.column_config.NumberColumn(format="%.2f"),
+                    "Máximo (95%)": st.column_config.NumberColumn(format="%.2f"),
+                },
+            )
+            st.caption(
+                f"Tendencia de cada valor en las versiones guardadas, un mes después de la más reciente. "
+                f"Cada versión pesa la mitad por cada {HALF_LIFE_MONTHS:g} meses de antigüedad."
+            )
+            if st.button("🔮 Prellenar con el pronóstico"):
+                # Applied by the hydration step of the next run, like a loaded version
+                st.session_state.load_version_data = {field: valor for field, (_, valor, _, _) in pronostico.items()}
+                st.rerun()
+
     # ----------------- SAVE SECTION -----------------
     with st.container():
         st.markdown('<div class="save-section">', unsafe_allow_html=True)
@@ -448,27 +437,16 @@ if page == "Calculadora Principal":
             st.write("")  # Empty space for alignment
             if st.button("💾 Guardar", type="primary"):
                 if version_name:
-                    # Prepare data to save
-                    data_to_save = {
-                        'carne_fresca': st.session_state.carne_fresca,
-                        'sal': st.session_state.sal,
-                        'sueldo1': st.session_state.sueldo1,
-                        'trabajador_adicional': st.session_state.trabajador_adicional,
-                        'empleado_ventas': st.session_state.empleado_ventas,
-                        'redes_sociales': st.session_state.redes_sociales,
-                        'corte_carne': st.session_state.corte_carne,
-                        'luz': st.session_state.luz,
-                        'agua': st.session_state.agua,
-                        'fumigacion': st.session_state.fumigacion,
-                        'liquidos_limpieza': st.session_state.liquidos_limpieza,
-                        'otro_liquido': st.session_state.otro_liquido,
-                        'total_unidades': st.session_state.total_unidades,
-                        'precio_venta': st.session_state.precio_venta,
-                        'precio_venta_sugerido': st.session_state.precio_venta_sugerido
-                    }
-                    
-                    save_calculation(version_name, data_to_save)
-                    st.success(f"✅ Versión '{version_name}' guardada exitosamente!")
+                    # The shared writer acknowledges once the group commit holding this save is done
+                    guardado = submit_save(version_name, registro)
+                    try:
+                        guardado.result(timeout=WRITE_TIMEOUT)
+                    except TimeoutError:
+                        st.warning("⏳ La base de datos está ocupada; la versión se guardará en cuanto se libere.")
+                    except sqlite3.Error as e:
+                        st.error(f"❌ No se pudo guardar la versión: {e}")
+                    else:
+                        st.success(f"✅ Versión '{version_name}' guardada exitosamente!")
                 else:
                     st.error("❌ Por favor ingresa un nombre para la versión")
         
@@ -502,32 +480,29 @@ if page == "Calculadora Principal":
     st.info("**Todos los valores se actualizan en tiempo real.**")
 
     # ----------------- CÁLCULOS -----------------
-    costo_unitario_empaque = 2.0
-    empaques = st.session_state.total_unidades * costo_unitario_empaque
-
-    costo_total = (
-        st.session_state.carne_fresca + st.session_state.sal + st.session_state.corte_carne +
-        st.session_state.sueldo1 + st.session_state.trabajador_adicional + st.session_state.empleado_ventas + st.session_state.redes_sociales +
-        st.session_state.luz + st.session_state.agua + st.session_state.fumigacion +
-        st.session_state.liquidos_limpieza + st.session_state.otro_liquido +
-        empaques
-    )
-    costo_por_bolsa = costo_total / st.session_state.total_unidades
+    with perfil.section('calculos'):
+        costo_unitario_empaque = COSTO_UNITARIO_EMPAQUE
+        # Computed by record_metrics(), shared by every session with the same inputs
+        metricas = grafo.get('metricas')
 
-    utilidad_por_bolsa = st.session_state.precio_venta - costo_por_bolsa
-    utilidad_total = utilidad_por_bolsa * st.session_state.total_unidades
-    utilidad_pct = (utilidad_por_bolsa / st.session_state.precio_venta * 100) if st.session_state.precio_venta else 0
+        empaques = metricas['empaques']
+        costo_total = metricas['costo_total']
+        costo_por_bolsa = metricas['costo_por_bolsa']
 
-    utilidad_por_bolsa_sug = st.session_state.precio_venta_sugerido - costo_por_bolsa
-    utilidad_total_sug = utilidad_por_bolsa_sug * st.session_state.total_unidades
-    utilidad_pct_sug = (utilidad_por_bolsa_sug / st.session_state.precio_venta_sugerido * 100) if st.session_state.precio_venta_sugerido else 0
+        utilidad_por_bolsa = metricas['utilidad_por_bolsa']
+        utilidad_total = metricas['utilidad_total']
+        utilidad_pct = metricas['utilidad_pct']
+
+        utilidad_por_bolsa_sug = metricas['utilidad_por_bolsa_sug']
+        utilidad_total_sug = metricas['utilidad_total_sug']
+        utilidad_pct_sug = metricas['utilidad_pct_sug']
 
     # ----------------- MÉTRICAS -----------------
     st.success(f"### Costo total del mes: ${costo_total:,.2f}")
 
     col1, col2 = st.columns(2)
     col1.metric("Costo/bolsa", f"${costo_por_bolsa:,.2f}")
-    col2.metric("Bolsas producidas", f"{st.session_state.total_unidades}")
+    col2.metric("Bolsas producidas", f"{registro.total_unidades}")
 
     st.markdown("---")
 
@@ -551,143 +526,670 @@ if page == "Calculadora Principal":
     e1.metric("Costo total empaques", f"${empaques:,.2f}")
     e2.metric("Costo empaque / bolsa", f"${costo_unitario_empaque:.2f}")
 
-    # ----------------- FUNCIÓN AUTOPCT -----------------
-    def make_autopct(values):
-        def my_autopct(pct):
-            total = sum(values)
-            val = pct * total / 100
-            return f"{val:,.2f}\n({pct:.1f}%)"
-        return my_autopct
-
     # ----------------- GRÁFICOS -----------------
+    with timed_imports('charts (matplotlib)'):
+        import charts
+
     st.header("📊 Análisis Gráfico")
 
     # 1) Costos por rubro
     st.subheader("1. Costos por Rubro")
-    labels = [
-        "Carne fresca","Sal","Corte","Sueldo princ.","Trabajador adic.","Empleado ventas","Redes sociales",
-        "Luz","Agua","Fumigación","Líquidos limp.","Otro líquido","Empaques"
-    ]
-    values = [
-        st.session_state.carne_fresca, st.session_state.sal, st.session_state.corte_carne, st.session_state.sueldo1, st.session_state.trabajador_adicional, st.session_state.empleado_ventas, st.session_state.redes_sociales,
-        st.session_state.luz, st.session_state.agua, st.session_state.fumigacion, st.session_state.liquidos_limpieza, st.session_state.otro_liquido, empaques
-    ]
-    fig1, ax1 = plt.subplots(figsize=(6,3))
-    ax1.barh(labels, values, color="#C41E3A")
-    ax1.set_xlabel("Monto ($)", fontsize=9)
-    ax1.set_title("Costos por Rubro", fontsize=11)
-    ax1.tick_params(axis='y', labelsize=8)
-    ax1.tick_params(axis='x', labelsize=8)
-    st.pyplot(fig1)
+    with perfil.section('grafico.1'):
+        st.image(grafo.get('grafico.costos_por_rubro'), width="stretch")
 
     # 2) Pie Actual
     st.subheader("2. Composición Precio Actual")
-    labels_act = ["Costo", "Utilidad"] if utilidad_por_bolsa >= 0 else ["Costo", "Pérdida"]
-    sizes_act = [costo_por_bolsa, abs(utilidad_por_bolsa)]
-    colors_act = ['#FFE4B3', '#C41E3A'] if utilidad_por_bolsa >= 0 else ['#FFE4B3', '#FF9999']
-    fig2, ax2 = plt.subplots(figsize=(3,3))
-    wedges2, texts2, autotexts2 = ax2.pie(
-        sizes_act,
-        labels=labels_act,
-        startangle=90,
-        autopct=make_autopct(sizes_act),
-        colors=colors_act,
-        textprops={'fontsize': 8}
-    )
-    ax2.set_title("Actual", fontsize=11)
-    ax2.axis('equal')
-    st.pyplot(fig2)
+    with perfil.section('grafico.2'):
+        st.image(grafo.get('grafico.composicion_actual'), width="stretch")
 
     # 3) Pie Sugerido
     st.subheader("3. Composición Precio Sugerido")
-    labels_sug = ["Costo", "Utilidad"] if utilidad_por_bolsa_sug >= 0 else ["Costo", "Pérdida"]
-    sizes_sug = [costo_por_bolsa, abs(utilidad_por_bolsa_sug)]
-    colors_sug = ['#E0F7FA', '#F4A261'] if utilidad_por_bolsa_sug >= 0 else ['#E0F7FA', '#FF9999']
-    fig3, ax3 = plt.subplots(figsize=(3,3))
-    wedges3, texts3, autotexts3 = ax3.pie(
-        sizes_sug,
-        labels=labels_sug,
-        startangle=90,
-        autopct=make_autopct(sizes_sug),
-        colors=colors_sug,
-        textprops={'fontsize': 8}
-    ) 
-    ax3.set_title("Sugerido", fontsize=11)
-    ax3.axis('equal')
-    st.pyplot(fig3)
+    with perfil.section('grafico.3'):
+        st.image(grafo.get('grafico.composicion_sugerido'), width="stretch")
 
     # 4) Stacked Bar
     st.subheader("4. Costo + Utilidad por Bolsa")
-    labels_cmp = ["Actual", "Sugerido"]
-    costs_cmp = [costo_por_bolsa, costo_por_bolsa]
-    profits_cmp = [utilidad_por_bolsa, utilidad_por_bolsa_sug]
-    fig4, ax4 = plt.subplots(figsize=(5,2.5))
-    x = np.arange(len(labels_cmp))
-    ax4.bar(x, costs_cmp, 0.6, label="Costo", color="#FFE4B3")
-    for i in range(2):
-        bottom = costs_cmp[i] if profits_cmp[i] >= 0 else costs_cmp[i] + profits_cmp[i]
-        color = "#C41E3A" if profits_cmp[i] >= 0 else "#FF9999"
-        ax4.bar(x[i], abs(profits_cmp[i]), 0.6, bottom=bottom, color=color)
-    ax4.set_xticks(x)
-    ax4.set_xticklabels(labels_cmp, fontsize=8)
-    ax4.set_ylabel("Monto ($)", fontsize=9)
-    ax4.set_title("Costo + Utilidad por Bolsa", fontsize=11)
-    for i in range(2):
-        total = costs_cmp[i] + profits_cmp[i]
-        if total != 0:
-            ax4.text(
-                x[i],
-                costs_cmp[i]/2,
-                f"${costs_cmp[i]:.2f}\n({costs_cmp[i]/total*100:.1f}%)",
-                ha="center", va="center", fontsize=8
+    with perfil.section('grafico.4'):
+        st.image(grafo.get('grafico.costo_utilidad'), width="stretch")
+
+    # ----------------- SENSIBILIDAD -----------------
+    st.header("🔥 Sensibilidad")
+    if st.checkbox("Mostrar análisis de sensibilidad precio × volumen"):
+        sc1, sc2 = st.columns(2)
+        with sc1:
+            precio_min = st.number_input("Precio mínimo ($)", min_value=0.0, value=round(costo_por_bolsa * 0.5, 2), step=1.0)
+            precio_max = st.number_input("Precio máximo ($)", min_value=0.0, value=round(max(costo_por_bolsa * 2, precio_min + 1), 2), step=1.0)
+        with sc2:
+            unidades_min = st.number_input("Bolsas mínimas", min_value=1, value=max(1, registro.total_unidades // 4), step=1)
+            unidades_max = st.number_input("Bolsas máximas", min_value=1, value=max(unidades_min + 1, registro.total_unidades * 2), step=1)
+        resolucion = st.slider("Resolución de la cuadrícula (celdas por eje)", min_value=50, max_value=500, value=200, step=50)
+
+        carne_range = None
+        carne_niveles = 0
+        if st.checkbox("Variar también carne fresca"):
+            cc1, cc2, cc3 = st.columns(3)
+            carne_min = cc1.number_input("Carne mínima ($)", min_value=0.0, value=round(registro.carne_fresca * 0.8, 2), step=100.0)
+            carne_max = cc2.number_input("Carne máxima ($)", min_value=0.0, value=round(registro.carne_fresca * 1.2, 2), step=100.0)
+            carne_niveles = cc3.number_input("Niveles", min_value=2, max_value=11, value=5, step=1)
+            carne_range = (carne_min, carne_max)
+
+        if precio_max <= precio_min or unidades_max <= unidades_min:
+            st.warning("⚠️ Los valores máximos deben ser mayores a los mínimos")
+        else:
+            with perfil.section('sensibilidad.cuadricula'):
+                precios, unidades, carnes, grid_total, grid_pct = cached_sensitivity_grid(
+                    registro,
+                    (precio_min, precio_max),
+                    (unidades_min, unidades_max),
+                    resolucion,
+                    carne_range,
+                    int(carne_niveles),
+                )
+            if carnes is not None:
+                nivel = st.select_slider(
+                    "Carne fresca ($)",
+                    options=list(range(len(carnes))),
+                    value=len(carnes) // 2,
+                    format_func=lambda i: f"{carnes[i]:,.2f}",
+                )
+                grid_total = grid_total[nivel]
+                grid_pct = grid_pct[nivel]
+
+            metrica = st.radio("Métrica", ["Utilidad total ($)", "Margen %"], horizontal=True)
+            datos = grid_total if metrica == "Utilidad total ($)" else np.clip(grid_pct, -100, 100)
+            st.image(
+                charts.sensitivity_heatmap(
+                    datos,
+                    grid_total,
+                    precios,
+                    unidades,
+                    (registro.precio_venta, registro.total_unidades),
+                    f"{metrica} — línea negra: punto de equilibrio",
+                ),
+                width="stretch",
+            )
+            st.caption(f"{grid_total.size:,} escenarios evaluados. El punto rojo marca el precio y volumen actuales.")
+
+    # ----------------- SIMULACIÓN DE RIESGO -----------------
+    st.header("🎲 Simulación de Riesgo")
+    if st.checkbox("Mostrar simulación Monte Carlo"):
+        import simulation
+
+        variables = st.multiselect(
+            "Entradas con incertidumbre",
+            options=list(INPUT_FIELDS),
+            default=['carne_fresca', 'total_unidades'],
+            format_func=INPUT_LABELS.get,
+        )
+        distribuciones = []
+        for field in variables:
+            actual = registro[field]
+            st.markdown(f"**{INPUT_LABELS[field]}** — actual: {actual:,.2f}")
+            d1, d2, d3, d4 = st.columns([2, 2, 2, 2])
+            tipo = d1.selectbox("Distribución", ["Triangular", "Normal"], key=f"sim_tipo_{field}")
+            if tipo == "Triangular":
+                minimo = d2.number_input("Mínimo", value=round(actual * 0.8, 2), key=f"sim_min_{field}")
+                moda = d3.number_input("Moda", value=round(actual, 2), key=f"sim_moda_{field}")
+                maximo = d4.number_input("Máximo", value=round(actual * 1.2, 2), key=f"sim_max_{field}")
+                distribuciones.append((field, simulation.triangular(minimo, moda, maximo)))
+            else:
+                media = d2.number_input("Media", value=round(actual, 2), key=f"sim_media_{field}")
+                desviacion = d3.number_input("Desv. estándar", min_value=0.0, value=round(actual * 0.1, 2), key=f"sim_desv_{field}")
+                distribuciones.append((field, simulation.normal(media, desviacion)))
+
+        m1, m2 = st.columns(2)
+        n_muestras = m1.select_slider("Muestras", options=[10_000, 100_000, 250_000, 500_000, 1_000_000], value=100_000, format_func=lambda n: f"{n:,}")
+        semilla = m2.number_input("Semilla", min_value=0, value=42, step=1)
+
+        try:
+            with perfil.section('simulacion'):
+                resultado = cached_simulation(
+                    registro,
+                    tuple(distribuciones),
+                    n_muestras,
+                    int(semilla),
+                )
+        except ValueError as e:
+            st.error(f"❌ {e}")
+        else:
+            st.metric("Probabilidad de pérdida (precio actual)", f"{resultado['prob_perdida'] * 100:.1f}%")
+            st.markdown("**Utilidad total**")
+            r1, r2, r3 = st.columns(3)
+            r1.metric("P5", f"${resultado['utilidad_total'][5]:,.2f}")
+            r2.metric("P50", f"${resultado['utilidad_total'][50]:,.2f}")
+            r3.metric("P95", f"${resultado['utilidad_total'][95]:,.2f}")
+            st.markdown("**Costo por bolsa**")
+            c1, c2, c3 = st.columns(3)
+            c1.metric("P5", f"${resultado['costo_por_bolsa'][5]:,.2f}")
+            c2.metric("P50", f"${resultado['costo_por_bolsa'][50]:,.2f}")
+            c3.metric("P95", f"${resultado['costo_por_bolsa'][95]:,.2f}")
+
+            conteos, bordes = resultado['histograma']
+            st.image(charts.profit_histogram(conteos, bordes), width="stretch")
+            st.caption(f"{resultado['n_samples']:,} escenarios simulados con semilla {int(semilla)}.")
+
+    # ----------------- OPTIMIZADOR DE PRECIO -----------------
+    st.header("💡 Optimizador de Precio")
+    if st.checkbox("Buscar el precio que maximiza la utilidad total"):
+        import pricing
+
+        fuente = st.radio("Curva de demanda", ["Elasticidad", "Observaciones de precio y volumen"], horizontal=True)
+        demanda = None
+        if fuente == "Elasticidad":
+            e1, e2, e3 = st.columns(3)
+            elasticidad = e1.number_input("Elasticidad", min_value=0.0, value=1.5, step=0.1, help="% que caen las ventas por cada 1% que sube el precio")
+            precio_ref = e2.number_input("Precio de referencia ($)", min_value=0.01, value=max(registro.precio_venta, 0.01), step=1.0)
+            unidades_ref = e3.number_input("Bolsas vendidas a ese precio", min_value=1, value=registro.total_unidades, step=1)
+            demanda = (elasticidad, precio_ref, float(unidades_ref))
+        else:
+            observaciones = st.data_editor(
+                [
+                    {"precio": round(registro.precio_venta, 2), "bolsas": registro.total_unidades},
+                    {"precio": round(registro.precio_venta * 1.2, 2), "bolsas": int(registro.total_unidades * 0.75)},
+                ],
+                num_rows="dynamic",
+                column_config={
+                    "precio": st.column_config.NumberColumn("Precio ($)", min_value=0.0, format="%.2f"),
+                    "bolsas": st.column_config.NumberColumn("Bolsas vendidas", min_value=0, step=1),
+                },
+                key="optimizador_observaciones",
             )
-            ax4.text(
-                x[i],
-                costs_cmp[i] + profits_cmp[i]/2,
-                f"${profits_cmp[i]:.2f}\n({profits_cmp[i]/total*100:.1f}%)",
-                ha="center", va="center", fontsize=8
+            filas = [fila for fila in observaciones if fila.get("precio") is not None and fila.get("bolsas") is not None]
+            try:
+                demanda = pricing.fit_demand([fila["precio"] for fila in filas], [fila["bolsas"] for fila in filas])
+            except ValueError as e:
+                st.error(f"❌ {e}")
+            else:
+                st.info(f"📈 Elasticidad estimada: {demanda[0]:.2f} (referencia: {demanda[2]:,.0f} bolsas a ${demanda[1]:,.2f})")
+
+        o1, o2, o3 = st.columns(3)
+        opt_min = o1.number_input("Precio mínimo a evaluar ($)", min_value=0.01, value=round(max(costo_por_bolsa * 0.5, 0.01), 2), step=1.0)
+        opt_max = o2.number_input("Precio máximo a evaluar ($)", min_value=0.01, value=round(max(costo_por_bolsa * 4, opt_min + 1), 2), step=1.0)
+        candidatos = o3.select_slider("Precios candidatos", options=[1_000, 5_000, 20_000, 100_000], value=pricing.DEFAULT_CANDIDATES, format_func=lambda n: f"{n:,}")
+        variables = st.multiselect(
+            "Costos que crecen con el volumen",
+            options=list(COST_FIELDS),
+            default=list(pricing.VARIABLE_COST_FIELDS),
+            format_func=INPUT_LABELS.get,
+            help="Se escalan en proporción a las bolsas vendidas; los demás costos se mantienen fijos",
+        )
+
+        if opt_max <= opt_min:
+            st.warning("⚠️ El precio máximo debe ser mayor al mínimo")
+        elif demanda is not None:
+            with perfil.section('optimizador'):
+                optimizacion = cached_price_optimization(
+                    registro,
+                    (opt_min, opt_max),
+                    candidatos,
+                    tuple(demanda),
+                    tuple(variables),
+                )
+            optimo = optimizacion['optimo']
+            r1, r2, r3, r4 = st.columns(4)
+            r1.metric("Precio óptimo", f"${optimo['precio']:,.2f}")
+            r2.metric("Bolsas vendidas", f"{optimo['unidades']:,.0f}")
+            r3.metric("Costo por bolsa", f"${optimo['costo_por_bolsa']:,.2f}")
+            r4.metric("Utilidad total", f"${optimo['utilidad_total']:,.2f}", f"{optimo['utilidad_pct']:.1f}%")
+            if optimo['en_borde']:
+                st.warning("⚠️ El óptimo está en el borde del rango evaluado; amplía el rango de precios.")
+            st.image(
+                charts.price_optimization_chart(
+                    optimizacion['precios'],
+                    optimizacion['utilidad_total'],
+                    optimizacion['unidades'],
+                    optimo,
+                    registro.precio_venta,
+                ),
+                width="stretch",
             )
-    st.pyplot(fig4)
+            st.caption(f"{len(optimizacion['precios']):,} precios evaluados con demanda de elasticidad constante.")
+            if st.button("✨ Usar como precio sugerido"):
+                st.session_state.precio_venta_sugerido = round(optimo['precio'], 2)
+                st.rerun()
 
     st.caption("Desarrollado para La Vaquita Feliz 🐮 — tablas y gráficos optimizados para lectura.")
 
 # ----------------- VERSIONS PAGE -----------------
 elif page == "Versiones Guardadas":
+    with timed_imports('pandas'):
+        import pandas as pd
+
     st.title("📂 Versiones Guardadas")
     st.subheader("Gestión de Cálculos Guardados")
 
-    # Get all versions
-    versions = get_all_versions()
+    # ----------------- IMPORTAR / EXPORTAR -----------------
+    with st.expander("📥 Importar / 📤 Exportar versiones"):
+        archivo = st.file_uploader(
+            "Archivo CSV o Parquet",
+            type=["csv", "parquet"],
+            help="Columnas requeridas: version_name y los 15 valores de la calculadora; created_date es opcional",
+        )
+        if archivo is not None and st.button("📥 Importar"):
+            try:
+                importadas, rechazadas = import_versions(archivo)
+            except ValueError as e:
+                st.error(f"❌ {e}")
+            else:
+                st.success(f"✅ {importadas} versión(es) importada(s).")
+                if not rechazadas.empty:
+                    st.warning(f"⚠️ {len(rechazadas)} fila(s) rechazada(s):")
+                    st.dataframe(rechazadas, hide_index=True)
+
+        formato = st.radio("Formato de exportación", ["csv", "parquet"], horizontal=True)
+        if st.button("📤 Preparar exportación"):
+            if 'export_file' in st.session_state:
+                st.session_state.pop('export_file')[0].remove()
+            # Stream to a temporary file instead of building the export in memory
+            destino = SessionFile(f".{formato}")
+            exportadas = export_versions(destino.name, formato)
+            st.session_state.export_file = (destino, formato, exportadas)
+        if 'export_file' in st.session_state:
+            destino, formato_exportado, exportadas = st.session_state.export_file
+            # Read only when clicked, not into memory on every rerun
+            st.download_button(
+                f"⬇️ Descargar {exportadas} versión(es)",
+                data=destino.read,
+                file_name=f"versiones.{formato_exportado}",
+            )
+
+    total_versiones = count_versions()
 
-    if not versions:
+    if not total_versiones:
         st.info("📝 No hay versiones guardadas aún. Ve a la Calculadora Principal para guardar tu primer cálculo.")
     else:
-        st.success(f"📊 Total de versiones guardadas: {len(versions)}")
+        st.success(f"📊 Total de versiones guardadas: {total_versiones}")
+
+        # ----------------- PUNTO DE EQUILIBRIO -----------------
+        # Loads every version, so it only runs when asked for
+        if st.checkbox("⚖️ Mostrar punto de equilibrio de todas las versiones"):
+            with timed_imports('calculator'):
+                from calculator import INPUT_FIELDS, break_even, compute_metrics
+
+            margen_objetivo = st.number_input(
+                "Margen objetivo (%)",
+                min_value=0.0,
+                max_value=95.0,
+                value=20.0,
+                step=1.0,
+                help="Margen usado para calcular el costo máximo de carne fresca",
+            )
+            tabla = get_all_version_inputs()
+            inputs = {field: tabla[field].fillna(0).to_numpy(dtype=float) for field in INPUT_FIELDS}
+            metricas = compute_metrics(inputs)
+            equilibrio = break_even(inputs, margen_objetivo)
+            resumen = pd.DataFrame({
+                "Versión": tabla['version_name'],
+                "Creado": tabla['created_date'],
+                "Costo/bolsa": metricas['costo_por_bolsa'],
+                "Precio actual": tabla['precio_venta'],
+                "Margen %": metricas['utilidad_pct'],
+                "Bolsas": tabla['total_unidades'],
+                "Bolsas equilibrio": equilibrio['unidades_equilibrio'],
+                "Margen seguridad %": equilibrio['margen_seguridad'],
+                "Carne fresca": tabla['carne_fresca'],
+                "Carne máx. objetivo": equilibrio['carne_max'],
+                "Precio sugerido": tabla['precio_venta_sugerido'],
+                "Bolsas equilibrio (sug.)": equilibrio['unidades_equilibrio_sug'],
+                "Carne máx. objetivo (sug.)": equilibrio['carne_max_sug'],
+            }).sort_values("Margen seguridad %")
+            st.dataframe(
+                resumen,
+                hide_index=True,
+                column_config={
+                    "Costo/bolsa": st.column_config.NumberColumn(format="$%.2f"),
+                    "Precio actual": st.column_config.NumberColumn(format="$%.2f"),
+                    "Margen %": st.column_config.NumberColumn(format="%.1f%%"),
+                    "Bolsas equilibrio": st.column_config.NumberColumn(format="%.1f"),
+                    "Margen seguridad %": st.column_config.NumberColumn(format="%.1f%%"),
+                    "Carne fresca": st.column_config.NumberColumn(format="$%.2f"),
+                    "Carne máx. objetivo": st.column_config.NumberColumn(format="$%.2f"),
+                    "Precio sugerido": st.column_config.NumberColumn(format="$%.2f"),
+                    "Bolsas equilibrio (sug.)": st.column_config.NumberColumn(format="%.1f"),
+                    "Carne máx. objetivo (sug.)": st.column_config.NumberColumn(format="$%.2f"),
+                },
+            )
+            st.caption("El precio de equilibrio es el costo por bolsa. Un margen de seguridad negativo indica que la versión pierde dinero; ordena por cualquier columna haciendo clic en su encabezado.")
         
-        # Display versions in a nice format
-        for version in versions:
-            version_id, version_name, created_date = version
-            
-            with st.container():
-                col1, col2, col3 = st.columns([3, 2, 1])
-                
-                with col1:
-                    st.markdown(f"**{version_name}**")
-                    st.caption(f"Creado: {created_date}")
-                
-                with col2:
-                    if st.button(f"📋 Cargar", key=f"load_{version_id}"):
-                        version_data = get_version_data(version_id)
-                        st.session_state.load_version_data = version_data
-                        st.success(f"✅ Versión '{version_name}' cargada. Ve a la Calculadora Principal para verla.")
-                        st.rerun()
-                
-                with col3:
-                    if st.button(f"🗑️ Eliminar", key=f"delete_{version_id}", type="secondary"):
-                        delete_version(version_id)
-                        st.success(f"🗑️ Versión '{version_name}' eliminada.")
+        # ----------------- ORDEN, FILTRO Y RESUMEN -----------------
+        # Sorted, filtered and aggregated in SQL over the stored metrics
+        etiquetas = {
+            'created_date': "Fecha de creación",
+            'costo_total': "Costo total",
+            'costo_por_bolsa': "Costo/bolsa",
+            'utilidad_total': "Utilidad total",
+            'utilidad_pct': "Margen %",
+            'utilidad_total_sug': "Utilidad total (sug.)",
+            'utilidad_pct_sug': "Margen % (sug.)",
+        }
+        busqueda = st.text_input(
+            "🔍 Buscar versión",
+            placeholder="Ej: calculo enero",
+            help="No distingue mayúsculas ni acentos; acepta palabras incompletas o mal escritas",
+        ).strip()
+        if busqueda:
+            # Search results come by relevance
+            orden, descendente = None, False
+        else:
+            o1, o2 = st.columns(2)
+            orden = o1.selectbox("Ordenar por", SORT_COLUMNS, format_func=etiquetas.get)
+            descendente = o2.radio("Dirección", ["Descendente", "Ascendente"], horizontal=True) == "Descendente"
+        with st.expander("🔎 Filtrar por métrica"):
+            f1, f2, f3 = st.columns(3)
+            metrica = f1.selectbox("Métrica", STORED_METRICS, format_func=etiquetas.get)
+            minimo = f2.number_input("Mínimo", value=None, placeholder="Sin mínimo")
+            maximo = f3.number_input("Máximo", value=None, placeholder="Sin máximo")
+        filtros = ((metrica, minimo, maximo),) if minimo is not None or maximo is not None else ()
+
+        with perfil.section('versiones.resumen'):
+            resumen = version_stats(filtros)
+        r1, r2, r3, r4 = st.columns(4)
+        r1.metric("Versiones", f"{resumen['versiones']:,}")
+        if resumen['versiones']:
+            r2.metric("Costo/bolsa promedio", f"${resumen['costo_por_bolsa']['promedio'] or 0:,.2f}")
+            r3.metric("Margen % promedio", f"{resumen['utilidad_pct']['promedio'] or 0:.1f}%",
+                      help=f"Mín. {resumen['utilidad_pct']['minimo'] or 0:.1f}% · máx. {resumen['utilidad_pct']['maximo'] or 0:.1f}%")
+            r4.metric("Margen % sugerido promedio", f"{resumen['utilidad_pct_sug']['promedio'] or 0:.1f}%",
+                      help=f"Mín. {resumen['utilidad_pct_sug']['minimo'] or 0:.1f}% · máx. {resumen['utilidad_pct_sug']['maximo'] or 0:.1f}%")
+
+        # ----------------- LISTA PAGINADA -----------------
+        with perfil.section('versiones.lista'):
+            # Each entry is the (sort value, id) key the page starts after; (rank, id) when searching
+            consulta = (busqueda, orden, descendente, filtros)
+            if st.session_state.get('versions_query') != consulta:
+                # A new search, order or filter starts over, without the old selection
+                st.session_state.versions_query = consulta
+                st.session_state.versions_cursors = [None]
+                for key in [key for key in st.session_state if key.startswith('versions_table_')]:
+                    del st.session_state[key]
+            cursors = st.session_state.versions_cursors
+
+            # Fetch one extra row to know whether there is a next page
+            if busqueda:
+                filas, aproximada = search_versions(busqueda, filtros, PAGE_SIZE + 1, cursors[-1])
+                if not filas and len(cursors) == 1:
+                    st.info("🔎 Ninguna versión coincide con la búsqueda.")
+                elif aproximada:
+                    st.info("🔎 Sin coincidencias exactas; se muestran nombres parecidos.")
+            else:
+                filas = get_versions_page(cursors[-1], PAGE_SIZE + 1, orden, descendente, filtros)
+            if not filas and len(cursors) > 1:
+                # The page was emptied by a delete; go back one page
+                cursors.pop()
+                st.rerun()
+            hay_siguiente = len(filas) > PAGE_SIZE
+            filas = filas[:PAGE_SIZE]
+
+            pagina = pd.DataFrame(filas, columns=SEARCH_COLUMNS if busqueda else PAGE_COLUMNS).rename(
+                columns={'version_name': "Versión", 'created_date': "Creado"}
+            )
+            # The table keeps its selection as row positions; once the page holds
+            # other versions those positions would point at the wrong rows
+            tabla_key = f"versions_table_{len(cursors)}"
+            contenido = (tabla_key, tuple(pagina["id"]))
+            if st.session_state.get('versions_table_rows') != contenido:
+                st.session_state.versions_table_rows = contenido
+                st.session_state.pop(tabla_key, None)
+            seleccion = st.dataframe(
+                pagina,
+                hide_index=True,
+                column_order=("Versión", "Creado", 'costo_por_bolsa', 'utilidad_pct', 'utilidad_pct_sug', 'utilidad_total'),
+                column_config={
+                    'costo_por_bolsa': st.column_config.NumberColumn("Costo/bolsa", format="$%.2f"),
+                    'utilidad_pct': st.column_config.NumberColumn("Margen %", format="%.1f%%"),
+                    'utilidad_pct_sug': st.column_config.NumberColumn("Margen % (sug.)", format="%.1f%%"),
+                    'utilidad_total': st.column_config.NumberColumn("Utilidad total", format="$%.2f"),
+                },
+                on_select="rerun",
+                selection_mode="multi-row",
+                key=tabla_key,
+            )
+            seleccionadas = pagina.iloc[[fila for fila in seleccion.selection.rows if fila < len(pagina)]]
+            ids_seleccionados = [int(version_id) for version_id in seleccionadas["id"]]
+
+            b1, b2, b3 = st.columns(3)
+            with b1:
+                if st.button("📋 Cargar", disabled=len(seleccionadas) != 1, help="Selecciona una sola versión para cargarla"):
+                    version_name = seleccionadas.iloc[0]["Versión"]
+                    st.session_state.load_version_data = get_version_data(ids_seleccionados[0])
+                    st.success(f"✅ Versión '{version_name}' cargada. Ve a la Calculadora Principal para verla.")
+                    st.rerun()
+            with b2:
+                if st.button(f"🗑️ Eliminar ({len(seleccionadas)})", type="secondary", disabled=seleccionadas.empty):
+                    borrado = submit_delete(ids_seleccionados)
+                    st.session_state.pop(tabla_key, None)
+                    try:
+                        borrado.result(timeout=WRITE_TIMEOUT)
+                    except TimeoutError:
+                        st.warning("⏳ La base de datos está ocupada; las versiones se eliminarán en cuanto se libere.")
+                    except sqlite3.Error as e:
+                        st.error(f"❌ No se pudieron eliminar: {e}")
+                    else:
+                        st.success(f"🗑️ {len(seleccionadas)} versión(es) eliminada(s).")
                         st.rerun()
-                
-                st.markdown("---")
+            with b3:
+                if st.button(f"📄 Reporte ({len(seleccionadas)})", disabled=seleccionadas.empty, help="PDF y Excel de las versiones seleccionadas"):
+                    import subprocess
+                    import sys
+
+                    import database
+                    import reports
+
+                    for archivo_reporte in st.session_state.pop('report_files', ()):
+                        archivo_reporte.remove()
+                    # Stream both files to disk; the download buttons read them back when clicked
+                    pdf, xlsx = SessionFile(".pdf"), SessionFile(".xlsx")
+                    # In its own process, so the report's spawned workers never import this script
+                    comando = [
+                        sys.executable, reports.__file__, *map(str, ids_seleccionados), '--db', database.DB_PATH,
+                        '--pdf', pdf.name, '--xlsx', xlsx.name, '--workers', str(min(len(ids_seleccionados), os.cpu_count() or 1)),
+                    ]
+                    with st.spinner("Generando reporte..."), perfil.section('versiones.reporte'):
+                        resultado = subprocess.run(comando, capture_output=True, text=True)
+                    if resultado.returncode:
+                        pdf.remove()
+                        xlsx.remove()
+                        detalle = resultado.stderr.strip().splitlines()
+                        st.error(f"❌ No se pudo generar el reporte: {detalle[-1] if detalle else resultado.returncode}")
+                    else:
+                        st.session_state.report_files = [pdf, xlsx]
+            if 'report_files' in st.session_state:
+                pdf, xlsx = st.session_state.report_files
+                r1, r2 = st.columns(2)
+                r1.download_button("⬇️ Reporte PDF", data=pdf.read, file_name="reporte_versiones.pdf", mime="application/pdf")
+                r2.download_button("⬇️ Reporte Excel", data=xlsx.read, file_name="reporte_versiones.xlsx")
+
+            n1, n2, n3 = st.columns([1, 2, 1])
+            with n1:
+                if st.button("◀ Anterior", disabled=len(cursors) == 1):
+                    cursors.pop()
+                    st.rerun()
+            with n2:
+                if busqueda:
+                    # Searches with too many matches to rank come back newest first, without a rank
+                    criterio = "los más recientes" if filas and filas[0][-1] is None else "los más relevantes"
+                    st.caption(f"Página {len(cursors)} de los resultados, {criterio} primero")
+                else:
+                    paginas = max(1, -(-resumen['versiones'] // PAGE_SIZE))
+                    st.caption(f"Página {len(cursors)} de {paginas}")
+            with n3:
+                if st.button("Siguiente ▶", disabled=not hay_siguiente):
+                    ultima = filas[-1]
+                    clave = ultima[-1] if busqueda else ultima[PAGE_COLUMNS.index(orden)]
+                    cursors.append((clave, ultima[0]))
+                    st.rerun()
+
+# ----------------- TRENDS PAGE -----------------
+elif page == "Tendencias":
+    with timed_imports('history'):
+        from history import get_history
+
+    st.title("📈 Tendencias")
+    st.subheader("Evolución de costos y márgenes entre versiones")
+
+    historial = get_history()
+    if len(historial) == 0:
+        st.info("📝 No hay versiones guardadas aún. Ve a la Calculadora Principal para guardar tu primer cálculo.")
+    else:
+        agrupacion = st.radio("Agrupación", ["Por mes", "Por versión"], horizontal=True)
+        if agrupacion == "Por mes":
+            serie = historial.monthly()
+        else:
+            serie = historial.frame().set_index('created_date')
+
+        st.markdown("#### Costo por bolsa ($)")
+        st.line_chart(serie[['costo_por_bolsa']].rename(columns={'costo_por_bolsa': "Costo/bolsa"}))
+
+        st.markdown("#### Participación de la carne fresca en el costo (%)")
+        st.line_chart(serie[['participacion_carne']].rename(columns={'participacion_carne': "Carne fresca %"}))
+
+        st.markdown("#### Margen (%)")
+        st.line_chart(serie[['utilidad_pct', 'utilidad_pct_sug']].rename(columns={'utilidad_pct': "Actual", 'utilidad_pct_sug': "Sugerido"}))
+
+        if agrupacion == "Por mes":
+            st.markdown("#### Cambio mes a mes")
+            st.caption("Diferencia contra el mes anterior con versiones guardadas.")
+            st.bar_chart(serie[['costo_por_bolsa_delta']].rename(columns={'costo_por_bolsa_delta': "Δ Costo/bolsa ($)"}))
+            st.bar_chart(serie[['participacion_carne_delta', 'utilidad_pct_delta']].rename(columns={
+                'participacion_carne_delta': "Δ Carne fresca (pts)",
+                'utilidad_pct_delta': "Δ Margen actual (pts)",
+            }))
+            st.dataframe(
+                serie[['versiones', 'costo_por_bolsa', 'costo_por_bolsa_delta_pct', 'participacion_carne', 'utilidad_pct', 'utilidad_pct_delta']],
+                column_config={
+                    'versiones': st.column_config.NumberColumn("Versiones"),
+                    'costo_por_bolsa': st.column_config.NumberColumn("Costo/bolsa", format="$%.2f"),
+                    'costo_por_bolsa_delta_pct': st.column_config.NumberColumn("Δ Costo/bolsa %", format="%.1f%%"),
+                    'participacion_carne': st.column_config.NumberColumn("Carne fresca %", format="%.1f%%"),
+                    'utilidad_pct': st.column_config.NumberColumn("Margen %", format="%.1f%%"),
+                    'utilidad_pct_delta': st.column_config.NumberColumn("Δ Margen (pts)", format="%.1f"),
+                },
+            )
+
+# ----------------- MULTI-PRODUCT PAGE -----------------
+elif page == "Multi-Producto":
+    with timed_imports('pandas'):
+        import pandas as pd
+    with timed_imports('allocation'):
+        import allocation
+        from calculator import COSTO_UNITARIO_EMPAQUE, InputRecord
+
+    st.title("🧮 Multi-Producto")
+    st.subheader("Reparto de costos compartidos entre productos")
+
+    # Shared costs come from the main calculator; editable here for what-if runs
+    registro = InputRecord.from_mapping(st.session_state)
+    st.markdown("#### Costos compartidos del mes")
+    fondos = {}
+    actuales = allocation.pool_amounts(registro)
+    columnas = st.columns(len(allocation.POOLS))
+    for columna, pool, actual in zip(columnas, allocation.POOLS, actuales):
+        fondos[pool] = columna.number_input(f"{allocation.POOL_LABELS[pool]} ($)", min_value=0.0, value=round(float(actual), 2), step=10.0)
+    if 'initialized' not in st.session_state:
+        st.caption("Abre la Calculadora Principal para tomar los costos de ahí.")
+
+    st.markdown("#### Productos")
+    # Catalog from the storefront's data/products.ts; volumes and costs are editable estimates
+    unidades_machaca = registro.total_unidades if 'initialized' in st.session_state else 453
+    directo_machaca = registro.carne_fresca + registro.sal + registro.corte_carne
+    productos = st.data_editor(
+        pd.DataFrame([
+            {"nombre": "Machaca Premium", "precio": 250.0, "unidades": unidades_machaca, "peso_kg": 0.5, "horas": 0.15,
+             "costo_directo": round(directo_machaca / max(unidades_machaca, 1) + COSTO_UNITARIO_EMPAQUE, 2)},
+            {"nombre": "Cecina con Chile y Limón", "precio": 100.0, "unidades": 150, "peso_kg": 0.25, "horas": 0.1,
+             "costo_directo": 45.0},
+        ]),
+        num_rows="dynamic",
+        column_config={
+            "nombre": st.column_config.TextColumn("Producto"),
+            "precio": st.column_config.NumberColumn("Precio ($)", min_value=0.0, format="%.2f"),
+            "unidades": st.column_config.NumberColumn("Unidades/mes", min_value=0, step=1),
+            "peso_kg": st.column_config.NumberColumn("Kg por unidad", min_value=0.0, format="%.3f"),
+            "horas": st.column_config.NumberColumn("Horas por unidad", min_value=0.0, format="%.3f"),
+            "costo_directo": st.column_config.NumberColumn("Costo directo/unidad ($)", min_value=0.0, format="%.2f",
+                                                           help="Carne, sal, corte y empaque de una unidad"),
+        },
+        hide_index=True,
+        key="multi_productos",
+    )
+    productos = productos.dropna(subset=["nombre"]).reset_index(drop=True)
+
+    st.markdown("#### Regla de reparto")
+    escenario = {}
+    columnas = st.columns(len(allocation.POOLS))
+    for columna, pool in zip(columnas, allocation.POOLS):
+        escenario[pool] = columna.selectbox(
+            allocation.POOL_LABELS[pool], allocation.DRIVERS, format_func=allocation.DRIVER_LABELS.get, key=f"reparto_{pool}"
+        )
+
+    if productos.empty:
+        st.info("📝 Agrega al menos un producto.")
+    else:
+        skus = {field: productos[field].fillna(0).to_numpy(dtype=float) for field in allocation.SKU_FIELDS}
+        # The chosen rule plus every driver combination, in one pass
+        escenarios = [escenario] + allocation.all_scenarios()
+        with perfil.section('multiproducto.reparto'):
+            reparto = allocation.allocate(list(fondos.values()), skus, escenarios)
+
+        sin_asignar = reparto['sin_asignar']
+        if sin_asignar[0].any():
+            faltantes = ", ".join(
+                f"{allocation.POOL_LABELS[pool]} (${monto:,.2f})" for pool, monto in zip(allocation.POOLS, sin_asignar[0]) if monto
+            )
+            st.warning(f"⚠️ Sin unidades, kg u horas para repartir: {faltantes}. Ese costo no está en los resultados.")
+        # Combinations that leave a pool unassigned would overstate the margins
+        completos = reparto['margen'][1:][~sin_asignar[1:].any(axis=1)]
+        resultado = pd.DataFrame({
+            "Producto": productos["nombre"],
+            "Costo directo": skus["costo_directo"],
+            "Compartido/unidad": reparto['costo_unitario'][0] - skus["costo_directo"],
+            "Costo/unidad": reparto['costo_unitario'][0],
+            "Utilidad/unidad": reparto['utilidad_unitaria'][0],
+            "Margen %": reparto['margen'][0],
+            "Utilidad total": reparto['utilidad_total'][0],
+            "Margen mín. %": completos.min(axis=0) if len(completos) else float("nan"),
+            "Margen máx. %": completos.max(axis=0) if len(completos) else float("nan"),
+        })
+        st.dataframe(
+            resultado,
+            column_config={
+                name: st.column_config.NumberColumn(format="%.1f%%" if "%" in name else "$%.2f")
+                for name in resultado.columns if name != "Producto"
+            },
+            hide_index=True,
+        )
+        st.caption(
+            f"Mínimo y máximo entre las {len(completos)} de {len(escenarios) - 1} combinaciones de regla por fondo "
+            "que reparten todos los fondos. "
+            f"Utilidad total de todos los productos: ${reparto['utilidad_total'][0].sum():,.2f}"
+        )
+
+        st.markdown("#### Costo compartido asignado por fondo ($/mes)")
+        st.bar_chart(pd.DataFrame(
+            reparto['por_fondo'][0].T,
+            index=productos["nombre"],
+            columns=[allocation.POOL_LABELS[pool] for pool in allocation.POOLS],
+        ))
+
+# ----------------- PROFILING PANEL -----------------
+if PROFILE_ENABLED:
+    total_ms = perfil.finish(page)
+    with st.sidebar.expander("⏱️ Perfil de ejecución"):
+        st.caption(f"Total de la ejecución: {total_ms:.0f} ms")
+        for entry in perfil.sections:
+            st.text(f"{entry['section']:<24}{entry['ms']:9.1f} ms {entry['mem_delta_kb']:+9.0f} KB")
+        if page == "Calculadora Principal":
+            st.caption(f"Nodos recalculados: {', '.join(grafo.recomputed) or 'ninguno'}")
+
+# ----------------- STARTUP REPORT -----------------
+if REPORT_ENABLED:
+    from startup import FIRST_RUN, IMPORT_TIMES
 
-        # Show
\ No newline at end of file
+    duracion = time.perf_counter() - _run_start
+    record_run(duracion)
+    with st.sidebar.expander("🚀 Reporte de arranque"):
+        st.caption(f"Esta ejecución: {duracion * 1000:.0f} ms")
+        if FIRST_RUN is not None:
+            st.caption(f"Primera ejecución del proceso: {FIRST_RUN * 1000:.0f} ms")
+        for label, segundos in sorted(IMPORT_TIMES.items(), key=lambda item: -item[1]):
+            st.text(f"{label:<22}{segundos * 1000:8.0f} ms")
@@ -0,0 +1,246 @@
+"""Debounced autosave of in-progress calculations into sessions.db.
+
+Every rerun of the calculator page submits the current inputs under the
+session's draft key. Nothing is written on the script thread. A daemon
+writer thread waits until a key has been quiet for DEBOUNCE_SECONDS, or
+until MAX_DELAY_SECONDS have passed since its first pending edit, and then
+writes every due key in one transaction. Intermediate states of a burst of
+edits are never written. Each key owns a single row that is updated in
+place. The same thread deletes drafts older than MAX_AGE_DAYS every
+COMPACT_INTERVAL_SECONDS.
+"""
+import atexit
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from calculator import INPUT_FIELDS
+from database import PRAGMAS, migrate
+
+SESSIONS_PATH = os.environ.get('VAQUITA_SESSIONS_PATH', 'sessions.db')
+
+DEBOUNCE_SECONDS = 2.0
+MAX_DELAY_SECONDS = 10.0
+MAX_AGE_DAYS = 14
+COMPACT_INTERVAL_SECONDS = 3600
+# Drafts whose last written inputs are remembered, to skip rewriting them
+# unchanged; the least recently used beyond this are forgotten
+WRITTEN_CACHE_SIZE = 1024
+
+logger = logging.getLogger('vaquita.autosave')
+
+_lock = threading.RLock()
+_connection = None
+_writer = None
+
+
+def _add_draft_columns(conn):
+    # The shipped sessions table predates these inputs and the draft key
+    existing = {row[1] for row in conn.execute('PRAGMA table_info(sessions)')}
+    for column in ('empleado_ventas', 'redes_sociales'):
+        if column not in existing:
+            conn.execute(f'ALTER TABLE sessions ADD COLUMN {column} REAL DEFAULT 0')
+    if 'draft_key' not in existing:
+        conn.execute('ALTER TABLE sessions ADD COLUMN draft_key TEXT')
+
+
+# Applied with database.migrate(); same rules as database.MIGRATIONS
+MIGRATIONS = (
+    # 1. Base table, as shipped
+    '''
+        CREATE TABLE IF NOT EXISTS sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT,
+            carne_fresca REAL,
+            sal REAL,
+            corte_carne REAL,
+            sueldo1 REAL,
+            trabajador_adicional REAL,
+            luz REAL,
+            agua REAL,
+            fumigacion REAL,
+            liquidos_limpieza REAL,
+            otro_liquido REAL,
+            total_unidades INTEGER,
+            precio_venta REAL,
+            precio_venta_sugerido REAL,
+            name TEXT DEFAULT ''
+        )
+    ''',
+    # 2. Missing inputs and the draft key
+    _add_draft_columns,
+    # 3. One row per draft, upserted in place
+    'CREATE UNIQUE INDEX IF NOT EXISTS idx_sessions_draft ON sessions (draft_key)',
+    # 4. Compaction by age
+    'CREATE INDEX IF NOT EXISTS idx_sessions_timestamp ON sessions (timestamp)',
+)
+
+_UPSERT = f'''
+    INSERT INTO sessions (draft_key, timestamp, {', '.join(INPUT_FIELDS)})
+    VALUES (:draft_key, :timestamp, {', '.join(':' + field for field in INPUT_FIELDS)})
+    ON CONFLICT (draft_key) DO UPDATE SET
+        timestamp = excluded.timestamp,
+        {', '.join(f'{field} = excluded.{field}' for field in INPUT_FIELDS)}
+'''
+
+
+def get_connection():
+    """Return the process-wide sessions.db connection, opening it on first use."""
+    global _connection
+    with _lock:
+        if _connection is None:
+            conn = sqlite3.connect(SESSIONS_PATH, check_same_thread=False)
+            for pragma in PRAGMAS:
+                conn.execute(pragma)
+            migrate(conn, MIGRATIONS)
+            _connection = conn
+        return _connection
+
+
+def configure(path):
+    """Point the module at another sessions file, writing pending drafts first."""
+    global SESSIONS_PATH, _connection
+    flush()
+    with _lock:
+        if _connection is not None:
+            _connection.close()
+            _connection = None
+        SESSIONS_PATH = path
+
+
+def _timestamp(when=None):
+    return (when or datetime.now()).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def write_drafts(drafts):
+    """Upsert ``{draft_key: inputs}`` in one transaction."""
+    rows = [
+        {'draft_key': key, 'timestamp': _timestamp(), **{field: data[field] for field in INPUT_FIELDS}}
+        for key, data in drafts.items()
+    ]
+    with _lock:
+        conn = get_connection()
+        with conn:
+            conn.executemany(_UPSERT, rows)
+
+
+def load_draft(key):
+    """Inputs last autosaved under ``key``, or None."""
+    with _lock:
+        cursor = get_connection().execute(
+            f'SELECT {", ".join(INPUT_FIELDS)} FROM sessions WHERE draft_key = ?', (key,)
+        )
+        row = cursor.fetchone()
+    return None if row is None else dict(zip(INPUT_FIELDS, row))
+
+
+def compact(max_age_days=MAX_AGE_DAYS):
+    """Delete drafts not touched in ``max_age_days``; returns how many."""
+    cutoff = _timestamp(datetime.now() - timedelta(days=max_age_days))
+    with _lock:
+        conn = get_connection()
+        with conn:
+            deleted = conn.execute(
+                'DELETE FROM sessions WHERE draft_key IS NOT NULL AND timestamp < ?', (cutoff,)
+            ).rowcount
+        if deleted:
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    return deleted
+
+
+class _Writer(threading.Thread):
+    """Daemon thread coalescing submitted drafts into debounced batch writes."""
+
+    def __init__(self):
+        super().__init__(name='vaquita-autosave', daemon=True)
+        self._condition = threading.Condition()
+        # draft_key -> (inputs, first pending edit, last edit)
+        self._pending = {}
+        # draft_key -> inputs last written, least recently used first
+        self._written = OrderedDict()
+        self._next_compaction = time.monotonic()
+
+    def submit(self, key, data):
+        with self._condition:
+            if key not in self._pending and self._written.get(key) == data:
+                self._written.move_to_end(key)
+                return
+            now = time.monotonic()
+            first = self._pending[key][1] if key in self._pending else now
+            self._pending[key] = (data, first, now)
+            self._condition.notify()
+
+    def _due(self, key, now):
+        _, first, last = self._pending[key]
+        return min(last + DEBOUNCE_SECONDS, first + MAX_DELAY_SECONDS) <= now
+
+    def _take(self, force=False):
+        now = time.monotonic()
+        keys = [key for key in self._pending if force or self._due(key, now)]
+        return {key: self._pending.pop(key)[0] for key in keys}
+
+    def _write(self, batch):
+        try:
+            write_drafts(batch)
+        except sqlite3.Error:
+            logger.exception("No se pudo guardar el borrador; se reintentará")
+            with self._condition:
+                # Keep newer edits that arrived meanwhile
+                for key, data in batch.items():
+                    self._pending.setdefault(key, (data, time.monotonic(), time.monotonic()))
+            return
+        with self._condition:
+            for key, data in batch.items():
+                self._written[key] = data
+                self._written.move_to_end(key)
+            while len(self._written) > WRITTEN_CACHE_SIZE:
+                self._written.popitem(last=False)
+
+    def flush(self):
+        with self._condition:
+            batch = self._take(force=True)
+        if batch:
+            self._write(batch)
+
+    def run(self):
+        while True:
+            with self._condition:
+                now = time.monotonic()
+                deadlines = [min(last + DEBOUNCE_SECONDS, first + MAX_DELAY_SECONDS) for _, first, last in self._pending.values()]
+                timeout = min(deadlines + [self._next_compaction]) - now
+                if timeout > 0:
+                    self._condition.wait(timeout)
+                batch = self._take()
+            if batch:
+                self._write(batch)
+            if time.monotonic() >= self._next_compaction:
+                self._next_compaction = time.monotonic() + COMPACT_INTERVAL_SECONDS
+                try:
+                    compact()
+                except sqlite3.Error:
+                    logger.exception("No se pudieron compactar los borradores")
+
+
+def _get_writer():
+    global _writer
+    with _lock:
+        if _writer is None:
+            _writer = _Writer()
+            _writer.start()
+            atexit.register(flush)
+        return _writer
+
+
+def submit(key, data):
+    """Queue the current inputs of draft ``key``; returns immediately."""
+    _get_writer().submit(key, {field: data[field] for field in INPUT_FIELDS})
+
+
+def flush():
+    """Write every pending draft now, e.g. before exiting."""
+    if _writer is not None:
+        _writer.flush()
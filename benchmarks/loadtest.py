@@ -0,0 +1,349 @@
+"""Load test: N staff members using app.py at the same time.
+
+Every simulated user is an AppTest session of app.py running on its own
+thread. All users share one process, i.e. one Streamlit worker serving N
+sessions, or with --processes they are spread over that many processes
+sharing the database file, i.e. as many workers.
+
+Limitation: AppTest swaps process-wide state (the Runtime singleton, config
+options) during a run, so a lock lets each process run only one rerun at a
+time. Users of one process are therefore served one at a time, and a
+user's latency includes the wait for the others' reruns. A real worker
+overlaps its sessions' reruns wherever they release the GIL, e.g. in SQLite
+and NumPy, which this doesn't model. The numbers for users in one process
+are an upper bound on latency, and only --processes runs reruns in
+parallel.
+Each user loops over weighted random actions until --duration
+runs out, pausing a random think time between them: edit a sidebar input,
+switch pages, save a version, load one or delete one. A throwaway database
+seeded with --versions versions is used, so the shipped files are never
+touched::
+
+    python benchmarks/loadtest.py --users 8                # 8 users for 60 s
+    python benchmarks/loadtest.py --users 4 8 16 32        # one run per level
+    python benchmarks/loadtest.py --users 16 --processes 4 --think 0
+
+Every script rerun is timed. The report gives p50/p95/p99 latency per
+action and overall (the cold first run of each session is reported apart),
+reruns per second, SQLite lock errors and the RSS of the worker processes
+sampled every --interval seconds. Lock errors are reruns that showed the
+"base de datos ocupada" warning or failed on a locked database; retries of
+the database writer that succeeded are counted separately.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import autosave  # noqa: E402
+import database  # noqa: E402
+from profiling import rss_kb  # noqa: E402
+from run import APP_PATH, populate  # noqa: E402
+
+PAGES = ("Calculadora Principal", "Versiones Guardadas", "Tendencias", "Multi-Producto")
+
+# Relative weight of each action; staff mostly edit inputs
+ACTIONS = {
+    'editar': 60,
+    'navegar': 20,
+    'guardar': 8,
+    'cargar': 8,
+    'eliminar': 4,
+}
+
+LOCK_MARKERS = ('locked', 'ocupada')
+
+# AppTest.run() is not safe to call from two threads at once
+_runner = threading.Lock()
+
+
+class _LockLog(logging.Handler):
+    """Count writer retries and lock errors logged by the database modules."""
+
+    def __init__(self):
+        super().__init__()
+        self.counts = Counter()
+
+    def emit(self, record):
+        if 'bloqueada' in record.getMessage():
+            self.counts['reintentos'] += 1
+        elif record.exc_info and 'locked' in str(record.exc_info[1]):
+            self.counts['bloqueos'] += 1
+
+
+class SimulatedUser:
+    """One AppTest session driven by weighted random actions."""
+
+    def __init__(self, number, seed, records):
+        from streamlit.testing.v1 import AppTest
+
+        self.number = number
+        self.rng = random.Random(seed * 10_007 + number)
+        self.records = records
+        self.saved = 0
+        self.at = AppTest.from_file(APP_PATH, default_timeout=300)
+        self.page = PAGES[0]
+
+    def rerun(self, action):
+        """Run the script once and record its latency and outcome."""
+        start = time.perf_counter()
+        try:
+            with _runner:
+                self.at.run()
+        except Exception as e:  # noqa: BLE001 - timeouts and script crashes are results too
+            outcome = 'bloqueo' if any(m in str(e) for m in LOCK_MARKERS) else 'error'
+        else:
+            outcome = self._outcome()
+        self.records.append((time.time(), self.number, action, (time.perf_counter() - start) * 1000, outcome))
+
+    def _outcome(self):
+        messages = [e.message for e in self.at.exception] + [e.value for e in self.at.error] + [e.value for e in self.at.warning]
+        if any(m in str(message) for message in messages for m in LOCK_MARKERS):
+            return 'bloqueo'
+        # st.error also shows a negative margin; only "❌" messages are failures
+        fallos = [e for e in self.at.error if str(e.value).startswith("❌")]
+        return 'error' if self.at.exception or fallos else 'ok'
+
+    def go_to(self, page):
+        if self.page != page:
+            self.at.sidebar.selectbox[0].select(page)
+            self.page = page
+            self.rerun('navegar')
+
+    def editar(self):
+        self.go_to(PAGES[0])
+        entrada = self.rng.choice(self.at.sidebar.number_input)
+        valor = entrada.value * self.rng.uniform(0.9, 1.1) if entrada.value else self.rng.uniform(0, 500)
+        entrada.set_value(max(1, round(valor)) if isinstance(entrada.value, int) else round(valor, 2))
+        self.rerun('editar')
+
+    def navegar(self):
+        self.go_to(self.rng.choice([page for page in PAGES if page != self.page]))
+
+    def guardar(self):
+        self.go_to(PAGES[0])
+        self.saved += 1
+        self.at.text_input[0].set_value(f"Carga u{self.number} #{self.saved}")
+        next(b for b in self.at.button if 'Guardar' in b.label).click()
+        self.rerun('guardar')
+
+    def _select_version(self):
+        self.go_to(PAGES[1])
+        lista = [d for d in self.at.dataframe if 'Creado' in d.value.columns]
+        if not lista or lista[-1].value.empty:
+            return False
+        cursores = len(self.at.session_state['versions_cursors'])
+        fila = self.rng.randrange(len(lista[-1].value))
+        self.at.session_state[f'versions_table_{cursores}'] = {'selection': {'rows': [fila], 'columns': [], 'cells': []}}
+        self.rerun('seleccionar')
+        return True
+
+    def cargar(self):
+        if self._select_version():
+            next(b for b in self.at.button if 'Cargar' in b.label).click()
+            self.rerun('cargar')
+
+    def eliminar(self):
+        if self._select_version():
+            next(b for b in self.at.button if 'Eliminar' in b.label).click()
+            self.rerun('eliminar')
+
+    def run(self, deadline, think):
+        self.rerun('inicio')
+        acciones, pesos = list(ACTIONS), list(ACTIONS.values())
+        while time.time() < deadline:
+            try:
+                getattr(self, self.rng.choices(acciones, pesos)[0])()
+            except (IndexError, StopIteration):
+                # A failed rerun left no widgets to act on; run the script again
+                self.rerun('recuperar')
+            if think:
+                time.sleep(self.rng.expovariate(1 / think))
+
+
+def share_script_cache():
+    """Compile app.py once per process, as the Streamlit server does.
+
+    AppTest creates a new ScriptCache on every run, so each rerun would
+    also pay for recompiling the script. The server shares one cache
+    across sessions.
+    """
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+
+    shared = ScriptCache()
+    get_bytecode = ScriptCache.get_bytecode
+    ScriptCache.get_bytecode = lambda self, script_path: get_bytecode(shared, script_path)
+
+
+def _sample_rss(samples, stop, interval):
+    while True:
+        samples.append((time.time(), os.getpid(), rss_kb()))
+        if stop.wait(interval):
+            return
+
+
+def run_users(numbers, duration, think, seed, interval, paths=None):
+    """Run the users ``numbers`` in threads of this process.
+
+    ``paths`` is the (versions, sessions) database pair to open first; a
+    worker process gets it, the in-process run has configured them already.
+    Returns the rerun records, the RSS samples and the lock log counts.
+    """
+    if paths is not None:
+        database.configure(paths[0])
+        autosave.configure(paths[1])
+        share_script_cache()
+    lock_log = _LockLog()
+    for name in ('vaquita.database', 'vaquita.autosave'):
+        logging.getLogger(name).addHandler(lock_log)
+
+    records, samples = [], []
+    stop = threading.Event()
+    sampler = threading.Thread(target=_sample_rss, args=(samples, stop, interval), daemon=True)
+    sampler.start()
+    try:
+        users = [SimulatedUser(number, seed, records) for number in numbers]
+        deadline = time.time() + duration
+        with ThreadPoolExecutor(max_workers=len(users)) as pool:
+            for future in [pool.submit(user.run, deadline, think) for user in users]:
+                future.result()
+        autosave.flush()
+    finally:
+        stop.set()
+        sampler.join()
+        for name in ('vaquita.database', 'vaquita.autosave'):
+            logging.getLogger(name).removeHandler(lock_log)
+    return records, samples, dict(lock_log.counts)
+
+
+def run_level(users, processes, args, directory):
+    """One load run with ``users`` concurrent users; returns its summary."""
+    paths = (os.path.join(directory, f'load_{users}.db'), os.path.join(directory, f'sessions_{users}.db'))
+    database.configure(paths[0])
+    autosave.configure(paths[1])
+    populate(args.versions)
+
+    start = time.time()
+    if processes <= 1:
+        records, samples, locks = run_users(range(users), args.duration, args.think, args.seed, args.interval)
+    else:
+        # Workers open the files themselves; release them here first
+        database.configure(':memory:')
+        autosave.configure(':memory:')
+        groups = [list(range(users))[p::processes] for p in range(processes)]
+        records, samples, locks = [], [], Counter()
+        with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = [
+                pool.submit(run_users, group, args.duration, args.think, args.seed, args.interval, paths)
+                for group in groups if group
+            ]
+            for future in futures:
+                group_records, group_samples, group_locks = future.result()
+                records += group_records
+                samples += group_samples
+                locks.update(group_locks)
+    elapsed = time.time() - start
+    database.configure(':memory:')
+    autosave.configure(':memory:')
+    return summarize(users, processes, records, samples, dict(locks), elapsed, start, args.interval)
+
+
+def _percentiles(values):
+    if not values:
+        return {'n': 0, 'p50': None, 'p95': None, 'p99': None}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {'n': len(values), 'p50': float(p50), 'p95': float(p95), 'p99': float(p99)}
+
+
+def summarize(users, processes, records, samples, locks, elapsed, start, interval):
+    por_accion = defaultdict(list)
+    outcomes = Counter()
+    for _, _, action, ms, outcome in records:
+        por_accion[action].append(ms)
+        outcomes[outcome] += 1
+    medidas = [ms for _, _, action, ms, _ in records if action != 'inicio']
+
+    # Total RSS of every worker process per sampling interval
+    ultimo = defaultdict(dict)
+    for when, pid, kb in samples:
+        if kb is not None:
+            ultimo[int((when - start) // interval)][pid] = kb
+    rss = [(bucket * interval, sum(pids.values()) / 1024) for bucket, pids in sorted(ultimo.items())]
+
+    return {
+        'usuarios': users,
+        'procesos': processes,
+        'segundos': elapsed,
+        'reruns_por_segundo': len(medidas) / elapsed if elapsed else 0.0,
+        'latencia': _percentiles(medidas),
+        'acciones': {action: _percentiles(values) for action, values in sorted(por_accion.items())},
+        'bloqueos': outcomes['bloqueo'] + locks.get('bloqueos', 0),
+        'reintentos': locks.get('reintentos', 0),
+        'errores': outcomes['error'],
+        'rss_mb': rss,
+    }
+
+
+def _ms(value):
+    return f"{value:>9.1f}" if value is not None else f"{'—':>9}"
+
+
+def print_level(summary):
+    print(f"\n== {summary['usuarios']} usuario(s), {summary['procesos']} proceso(s), {summary['segundos']:.0f} s ==")
+    print(f"{'acción':<14}{'n':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for action, stats in list(summary['acciones'].items()) + [('TOTAL', summary['latencia'])]:
+        print(f"{action:<14}{stats['n']:>7}{_ms(stats['p50'])}{_ms(stats['p95'])}{_ms(stats['p99'])}")
+    print(f"reruns/s: {summary['reruns_por_segundo']:.2f}   bloqueos: {summary['bloqueos']}   "
+          f"reintentos: {summary['reintentos']}   errores: {summary['errores']}")
+    print("RSS (MB): " + "  ".join(f"{t:.0f}s={mb:.0f}" for t, mb in summary['rss_mb']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de carga con usuarios simultáneos.")
+    parser.add_argument('--users', type=int, nargs='+', default=[8], help="usuarios simultáneos; varios valores = varias corridas")
+    parser.add_argument('--processes', type=int, default=1, help="procesos entre los que se reparten los usuarios")
+    parser.add_argument('--duration', type=float, default=60, help="segundos de carga por corrida")
+    parser.add_argument('--think', type=float, default=1.0, help="pausa media entre acciones en segundos (0 = sin pausa)")
+    parser.add_argument('--versions', type=int, default=200, help="versiones guardadas al inicio")
+    parser.add_argument('--interval', type=float, default=5, help="segundos entre muestras de RSS")
+    parser.add_argument('--seed', type=int, default=0, help="semilla de las acciones")
+    parser.add_argument('--json', help="guardar los resultados en este archivo")
+    args = parser.parse_args(argv)
+
+    share_script_cache()
+    summaries = []
+    with tempfile.TemporaryDirectory() as directory:
+        for users in args.users:
+            summary = run_level(users, min(args.processes, users), args, directory)
+            print_level(summary)
+            summaries.append(summary)
+
+    if len(summaries) > 1:
+        print(f"\n{'usuarios':>8}{'reruns/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'bloqueos':>10}{'errores':>9}{'RSS máx MB':>12}")
+        for s in summaries:
+            pico = max((mb for _, mb in s['rss_mb']), default=0)
+            print(f"{s['usuarios']:>8}{s['reruns_por_segundo']:>10.2f}{_ms(s['latencia']['p50'])}{_ms(s['latencia']['p95'])}"
+                  f"{_ms(s['latencia']['p99'])}{s['bloqueos']:>10}{s['errores']:>9}{pico:>12.0f}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as handle:
+            json.dump(summaries, handle, indent=2)
+        print(f"Resultados guardados en {args.json}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,220 @@
+"""Performance benchmarks for script reruns, database operations and charts.
+
+Drives app.py headlessly with Streamlit's AppTest against a throwaway
+database, so the shipped machaca_calculator.db is never touched::
+
+    python benchmarks/run.py --save-baseline     # record baseline.json
+    python benchmarks/run.py                     # compare, exit 1 on regression, 2 without a baseline
+    python benchmarks/run.py --sizes 10 1000     # skip the 100k-version run
+
+Every benchmark reports its median latency in milliseconds. A benchmark
+regresses when its median exceeds the baseline by more than --threshold
+(relative) and --slack-ms (absolute), so sub-millisecond noise on fast
+operations doesn't fail the run. Timings depend on the machine, so the
+baseline is recorded on the machine that runs the comparison and isn't
+committed; comparing without one fails.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import autosave  # noqa: E402
+import charts  # noqa: E402
+import database  # noqa: E402
+from calculator import COST_FIELDS, INPUT_FIELDS  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+APP_PATH = os.path.join(ROOT, 'app.py')
+
+SAMPLE_INPUTS = {
+    'carne_fresca': 52473.06,
+    'sal': 31.35,
+    'sueldo1': 7266.95,
+    'trabajador_adicional': 3000.00,
+    'empleado_ventas': 0.00,
+    'redes_sociales': 0.00,
+    'corte_carne': 1024.14,
+    'luz': 651.25,
+    'agua': 145.34,
+    'fumigacion': 726.69,
+    'liquidos_limpieza': 297.01,
+    'otro_liquido': 18.35,
+    'total_unidades': 453,
+    'precio_venta': 145.18,
+    'precio_venta_sugerido': 196.00,
+}
+
+
+def measure(fn, repeat, setup=None):
+    """Median wall time of ``fn()`` in milliseconds over ``repeat`` calls."""
+    samples = []
+    for i in range(repeat):
+        if setup is not None:
+            setup(i)
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def populate(n):
+    """Fill the current database with ``n`` versions in one transaction."""
+    columns = ('version_name', 'created_date') + INPUT_FIELDS + database.STORED_METRICS
+    inputs = [
+        tuple(SAMPLE_INPUTS[field] * (1 + (i % 7) / 100) for field in INPUT_FIELDS)
+        for i in range(n)
+    ]
+    metrics = database.derived_metrics(dict(zip(INPUT_FIELDS, np.array(inputs).reshape(n, -1).T)))
+    rows = [
+        (f"Versión {i}", f"2025-{i % 12 + 1:02d}-01 00:{i // 60 % 60:02d}:{i % 60:02d}")
+        + inputs[i] + tuple(metrics[name][i] for name in database.STORED_METRICS)
+        for i in range(n)
+    ]
+    conn = database.get_connection()
+    with conn:
+        conn.executemany(
+            f"INSERT INTO calculation_versions ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            rows,
+        )
+    database.invalidate_caches()
+
+
+def bench_reruns(repeat):
+    from streamlit.testing.v1 import AppTest
+
+    results = {}
+    at = AppTest.from_file(APP_PATH, default_timeout=120).run()
+    results['rerun.calculadora'] = measure(at.run, repeat)
+
+    carne = at.sidebar.number_input[0]
+
+    def change_input(i):
+        carne.set_value(SAMPLE_INPUTS['carne_fresca'] + i + 1)
+
+    results['rerun.calculadora.cambio'] = measure(at.run, repeat, setup=change_input)
+
+    at.sidebar.selectbox[0].select("Versiones Guardadas").run()
+    results['rerun.versiones'] = measure(at.run, repeat)
+    return results
+
+
+def bench_database(sizes, repeat):
+    results = {}
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            database.configure(os.path.join(directory, 'bench.db'))
+            populate(size)
+            ids = [row[0] for row in database.get_connection().execute('SELECT id FROM calculation_versions')]
+
+            results[f'db.{size}.save_calculation'] = measure(
+                lambda: database.save_calculation("Benchmark", SAMPLE_INPUTS), repeat
+            )
+            # Cold reads: drop the memoized results before each call
+            results[f'db.{size}.get_all_versions'] = measure(
+                database.get_all_versions, repeat, setup=lambda i: database.invalidate_caches()
+            )
+            results[f'db.{size}.get_version_data'] = measure(
+                lambda: database.get_version_data(ids[len(ids) // 2]), repeat,
+                setup=lambda i: database.invalidate_caches(),
+            )
+            saved = []
+            results[f'db.{size}.delete_version'] = measure(
+                lambda: database.delete_version(saved.pop()), repeat,
+                setup=lambda i: saved.append(database.save_calculation("Borrar", SAMPLE_INPUTS)),
+            )
+            # Close the connection before the directory goes away
+            database.configure(':memory:')
+    return results
+
+
+def bench_charts(repeat):
+    costo_por_bolsa = 146.89
+    values = tuple(float(SAMPLE_INPUTS[field]) for field in COST_FIELDS) + (906.0,)
+    renders = {
+        'chart.costos_por_rubro': (charts.cost_breakdown_chart, lambda: charts.cost_breakdown_chart(values)),
+        'chart.composicion_actual': (charts.price_composition_chart,
+                                     lambda: charts.price_composition_chart(costo_por_bolsa, -1.71, "Actual")),
+        'chart.composicion_sugerido': (charts.price_composition_chart,
+                                       lambda: charts.price_composition_chart(costo_por_bolsa, 49.11, "Sugerido")),
+        'chart.costo_utilidad': (charts.cost_profit_chart,
+                                 lambda: charts.cost_profit_chart(costo_por_bolsa, -1.71, 49.11)),
+    }
+    results = {}
+    for name, (cached, render) in renders.items():
+        # Clear the LRU so every sample is a real render
+        results[name] = measure(render, repeat, setup=lambda i, cached=cached: cached.cache_clear())
+    return results
+
+
+def compare(results, baseline, threshold, slack_ms):
+    """Print a comparison table and return the names of regressed benchmarks."""
+    regressions = []
+    print(f"{'benchmark':<36}{'ms':>10}{'base':>10}{'cambio':>10}")
+    for name, value in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:<36}{value:>10.2f}{'—':>10}{'':>10}")
+            continue
+        change = (value - base) / base * 100 if base else 0.0
+        regressed = value > base * (1 + threshold) and value - base > slack_ms
+        flag = "  ⚠️ REGRESIÓN" if regressed else ""
+        print(f"{name:<36}{value:>10.2f}{base:>10.2f}{change:>9.1f}%{flag}")
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks de la calculadora.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 1_000, 100_000], help="versiones guardadas por prueba de BD")
+    parser.add_argument('--repeat', type=int, default=15, help="repeticiones por benchmark")
+    parser.add_argument('--threshold', type=float, default=0.25, help="regresión relativa tolerada (0.25 = 25%%)")
+    parser.add_argument('--slack-ms', type=float, default=1.0, help="regresión absoluta tolerada en ms")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="archivo de referencia")
+    parser.add_argument('--save-baseline', action='store_true', help="guardar los resultados como referencia")
+    parser.add_argument('--skip-app', action='store_true', help="no medir las ejecuciones de app.py")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        # The app under AppTest shares this process, and thus this database module
+        database.configure(os.path.join(directory, 'app.db'))
+        autosave.configure(os.path.join(directory, 'sessions.db'))
+        populate(10)
+        results = {} if args.skip_app else bench_reruns(args.repeat)
+        database.configure(':memory:')
+        autosave.configure(':memory:')
+    results.update(bench_database(args.sizes, args.repeat))
+    results.update(bench_charts(args.repeat))
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as handle:
+            json.dump(results, handle, indent=2, sort_keys=True)
+        compare(results, {}, args.threshold, args.slack_ms)
+        print(f"Referencia guardada en {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        # Without a baseline nothing could ever regress; don't let the gate pass silently
+        compare(results, {}, args.threshold, args.slack_ms)
+        print(f"Sin referencia en {args.baseline}; ejecuta con --save-baseline para crearla.", file=sys.stderr)
+        return 2
+    with open(args.baseline, encoding='utf-8') as handle:
+        baseline = json.load(handle)
+    regressions = compare(results, baseline, args.threshold, args.slack_ms)
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) con regresión: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
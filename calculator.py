@@ -0,0 +1,299 @@
+"""Vectorized cost/profit model for the machaca calculator.
+
+Every function takes scalars or NumPy arrays and broadcasts them, so the same
+code prices a single scenario from the sidebar or thousands of them at once.
+Nothing in this module depends on Streamlit.
+"""
+from collections.abc import Mapping
+from functools import lru_cache
+from types import MappingProxyType
+
+import numpy as np
+
+COSTO_UNITARIO_EMPAQUE = 2.0
+
+# Monthly cost items, in the order used by the formulas and the charts.
+COST_FIELDS = (
+    'carne_fresca',
+    'sal',
+    'corte_carne',
+    'sueldo1',
+    'trabajador_adicional',
+    'empleado_ventas',
+    'redes_sociales',
+    'luz',
+    'agua',
+    'fumigacion',
+    'liquidos_limpieza',
+    'otro_liquido',
+)
+
+# The 15 inputs of the calculator, in the column order of calculation_versions.
+INPUT_FIELDS = (
+    'carne_fresca',
+    'sal',
+    'sueldo1',
+    'trabajador_adicional',
+    'empleado_ventas',
+    'redes_sociales',
+    'corte_carne',
+    'luz',
+    'agua',
+    'fumigacion',
+    'liquidos_limpieza',
+    'otro_liquido',
+    'total_unidades',
+    'precio_venta',
+    'precio_venta_sugerido',
+)
+
+# Values after "Resetear Todo", also used for inputs missing from a saved row.
+EMPTY_INPUTS = {field: 0.0 for field in INPUT_FIELDS}
+EMPTY_INPUTS['total_unidades'] = 1
+
+# Sidebar labels for each input, used wherever inputs are listed to the user.
+INPUT_LABELS = {
+    'carne_fresca': "Carne fresca ($)",
+    'sal': "Sal ($)",
+    'sueldo1': "Sueldo principal ($)",
+    'trabajador_adicional': "Trabajador adicional ($)",
+    'empleado_ventas': "Empleado de ventas ($)",
+    'redes_sociales': "Redes sociales ($)",
+    'corte_carne': "Costo de corte de carne ($)",
+    'luz': "Luz mensual ($)",
+    'agua': "Agua ($)",
+    'fumigacion': "Fumigación ($)",
+    'liquidos_limpieza': "Líquidos de limpieza ($)",
+    'otro_liquido': "Otro líquido de limpieza ($)",
+    'total_unidades': "Bolsas producidas",
+    'precio_venta': "Precio actual por bolsa ($)",
+    'precio_venta_sugerido': "Precio sugerido por bolsa ($)",
+}
+
+# Scenarios whose metrics stay memoized by record_metrics(), across sessions
+METRICS_CACHE_SIZE = 4096
+
+METRIC_FIELDS = (
+    'empaques',
+    'costo_total',
+    'costo_por_bolsa',
+    'utilidad_por_bolsa',
+    'utilidad_total',
+    'utilidad_pct',
+    'utilidad_por_bolsa_sug',
+    'utilidad_total_sug',
+    'utilidad_pct_sug',
+)
+
+
+class InputRecord(Mapping):
+    """Immutable, hashable set of the 15 calculator inputs.
+
+    Equal inputs give equal records with equal hashes, whichever session or
+    saved row they come from, so a record can key caches shared by every
+    session. Values are normalized on the way in: total_unidades to int, the
+    rest to float. Records are read-only mappings over INPUT_FIELDS, so
+    they can be passed to every function here, and also expose each input
+    as an attribute.
+    """
+
+    __slots__ = INPUT_FIELDS + ('_hash',)
+
+    def __init__(self, *values):
+        if len(values) != len(INPUT_FIELDS):
+            raise TypeError(f"InputRecord takes {len(INPUT_FIELDS)} values, got {len(values)}")
+        for field, value in zip(INPUT_FIELDS, values):
+            object.__setattr__(self, field, int(value) if field == 'total_unidades' else float(value))
+        object.__setattr__(self, '_hash', hash(self.values_tuple()))
+
+    @classmethod
+    def from_mapping(cls, data):
+        """Record of the INPUT_FIELDS of ``data``; missing or None values are EMPTY_INPUTS."""
+        return cls(*(EMPTY_INPUTS[field] if data.get(field) is None else data[field] for field in INPUT_FIELDS))
+
+    def values_tuple(self):
+        """The inputs in INPUT_FIELDS order."""
+        return tuple(getattr(self, field) for field in INPUT_FIELDS)
+
+    def __getitem__(self, field):
+        if field not in INPUT_FIELDS:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def __iter__(self):
+        return iter(INPUT_FIELDS)
+
+    def __len__(self):
+        return len(INPUT_FIELDS)
+
+    def __eq__(self, other):
+        if isinstance(other, InputRecord):
+            return self._hash == other._hash and self.values_tuple() == other.values_tuple()
+        return super().__eq__(other)
+
+    def __hash__(self):
+        return self._hash
+
+    def __setattr__(self, name, value):
+        raise AttributeError("InputRecord is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("InputRecord is immutable")
+
+    def __reduce__(self):
+        return (InputRecord, self.values_tuple())
+
+    def __repr__(self):
+        return f"InputRecord({', '.join(f'{field}={getattr(self, field)!r}' for field in INPUT_FIELDS)})"
+
+
+def _as_float(value):
+    return np.asarray(value, dtype=np.float64)
+
+
+def fixed_costs(inputs):
+    """Sum of the monthly cost items, excluding packaging."""
+    total = _as_float(inputs[COST_FIELDS[0]])
+    for field in COST_FIELDS[1:]:
+        total = total + _as_float(inputs[field])
+    return total
+
+
+def compute_costs(inputs):
+    """Compute empaques, costo_total and costo_por_bolsa.
+
+    ``inputs`` maps each cost field and ``total_unidades`` to a scalar or an
+    array; the result arrays have the broadcast shape of all of them.
+    """
+    total_unidades = _as_float(inputs['total_unidades'])
+    empaques = total_unidades * COSTO_UNITARIO_EMPAQUE
+    costo_total = fixed_costs(inputs) + empaques
+    with np.errstate(divide='ignore', invalid='ignore'):
+        costo_por_bolsa = costo_total / total_unidades
+    return {
+        'empaques': empaques,
+        'costo_total': costo_total,
+        'costo_por_bolsa': costo_por_bolsa,
+    }
+
+
+def price_metrics(precio, costo_por_bolsa, total_unidades):
+    """Return (utilidad_por_bolsa, utilidad_total, utilidad_pct) for a price.
+
+    The margin is 0 where the price is 0, matching the calculator page.
+    """
+    precio = _as_float(precio)
+    utilidad_por_bolsa = precio - costo_por_bolsa
+    utilidad_total = utilidad_por_bolsa * _as_float(total_unidades)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        utilidad_pct = np.where(precio != 0, utilidad_por_bolsa / precio * 100, 0.0)
+    return utilidad_por_bolsa, utilidad_total, utilidad_pct
+
+
+def compute_metrics(inputs, costs=None):
+    """Compute every derived metric for one or many scenarios in one pass.
+
+    ``inputs`` maps the names in INPUT_FIELDS to scalars or arrays. Pass the
+    result of compute_costs() as ``costs`` to avoid computing them twice.
+    Returns a dict keyed by METRIC_FIELDS.
+    """
+    if costs is None:
+        costs = compute_costs(inputs)
+    metrics = dict(costs)
+    total_unidades = inputs['total_unidades']
+    costo_por_bolsa = costs['costo_por_bolsa']
+
+    (metrics['utilidad_por_bolsa'],
+     metrics['utilidad_total'],
+     metrics['utilidad_pct']) = price_metrics(inputs['precio_venta'], costo_por_bolsa, total_unidades)
+    (metrics['utilidad_por_bolsa_sug'],
+     metrics['utilidad_total_sug'],
+     metrics['utilidad_pct_sug']) = price_metrics(inputs['precio_venta_sugerido'], costo_por_bolsa, total_unidades)
+    return metrics
+
+
+def to_scalars(metrics):
+    """Convert the 0-d arrays of a single-scenario result to plain floats."""
+    return {name: float(value) for name, value in metrics.items()}
+
+
+@lru_cache(maxsize=METRICS_CACHE_SIZE)
+def record_metrics(record):
+    """Metrics of one InputRecord as plain floats, computed once per process.
+
+    The result is read-only, since every session asking for the same
+    scenario shares it.
+    """
+    return MappingProxyType(to_scalars(compute_metrics(record)))
+
+
+def margin_for_price(precio, costo_por_bolsa):
+    """Margin % obtained when selling at ``precio``."""
+    precio = _as_float(precio)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (precio - costo_por_bolsa) / precio * 100
+
+
+def price_for_margin(margen, costo_por_bolsa):
+    """Price that yields ``margen`` % over ``costo_por_bolsa``.
+
+    Margins of 95% or more fall back to 20× the cost to avoid dividing by
+    (nearly) zero, as the sidebar has always done.
+    """
+    margen = _as_float(margen)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(margen < 95, costo_por_bolsa / (1 - margen / 100), costo_por_bolsa * 20)
+
+
+def sensitivity_grid(inputs, precios, unidades, carnes=None):
+    """Evaluate utilidad_total and utilidad_pct over a price × volume grid.
+
+    ``precios`` runs along the last axis and ``unidades`` along the one before
+    it; when ``carnes`` is given it adds a leading carne_fresca axis. The grid
+    is a single broadcast computation, so 500×500 cells cost one array pass.
+    Returns ``(utilidad_total, utilidad_pct)``.
+    """
+    grid = dict(inputs)
+    grid['precio_venta'] = _as_float(precios)[np.newaxis, :]
+    grid['total_unidades'] = _as_float(unidades)[:, np.newaxis]
+    if carnes is not None:
+        grid['carne_fresca'] = _as_float(carnes)[:, np.newaxis, np.newaxis]
+    costs = compute_costs(grid)
+    _, utilidad_total, utilidad_pct = price_metrics(
+        grid['precio_venta'], costs['costo_por_bolsa'], grid['total_unidades']
+    )
+    return utilidad_total, utilidad_pct
+
+
+def break_even(inputs, margen_objetivo=0.0):
+    """Closed-form break-even and goal-seek values for one or many scenarios.
+
+    Derived from the formulas on the calculator page, with
+    ``fijos = costo_total - empaques``:
+
+    - break-even units: ``precio × u = fijos + 2u`` → ``u = fijos ÷ (precio − 2)``,
+      infinite when the price doesn't even cover the packaging;
+    - break-even price: ``costo_por_bolsa``;
+    - max meat cost at ``margen_objetivo`` %: the carne_fresca that makes
+      ``costo_por_bolsa = precio × (1 − margen)``.
+
+    Each value is returned for both precio_venta and precio_venta_sugerido
+    (suffix ``_sug``), along with the margin of safety in % of the volume.
+    """
+    costs = compute_costs(inputs)
+    total_unidades = _as_float(inputs['total_unidades'])
+    fijos = costs['costo_total'] - costs['empaques']
+    otros_costos = costs['costo_total'] - _as_float(inputs['carne_fresca'])
+    objetivo = _as_float(margen_objetivo) / 100
+
+    result = {'precio_equilibrio': costs['costo_por_bolsa']}
+    for suffix, field in (('', 'precio_venta'), ('_sug', 'precio_venta_sugerido')):
+        precio = _as_float(inputs[field])
+        contribucion = precio - COSTO_UNITARIO_EMPAQUE
+        with np.errstate(divide='ignore', invalid='ignore'):
+            unidades = np.where(contribucion > 0, fijos / contribucion, np.inf)
+            seguridad = (total_unidades - unidades) / total_unidades * 100
+        result['unidades_equilibrio' + suffix] = unidades
+        result['margen_seguridad' + suffix] = seguridad
+        result['carne_max' + suffix] = precio * (1 - objetivo) * total_unidades - otros_costos
+    return result
@@ -0,0 +1,207 @@
+"""Chart rendering for the calculator page.
+
+Charts are drawn on standalone matplotlib Figures with the Agg canvas, never
+through pyplot, so nothing is kept in pyplot's global figure registry. Each
+renderer returns encoded image bytes. The four calculator charts are memoized
+in bounded LRU caches keyed by their exact inputs, so a rerun with unchanged
+numbers reuses the previous image instead of drawing it again.
+"""
+import io
+from contextlib import contextmanager
+from functools import lru_cache
+
+import matplotlib
+import numpy as np
+
+# Headless server: never let matplotlib probe for an interactive backend
+matplotlib.use("Agg")
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg  # noqa: E402
+from matplotlib.figure import Figure  # noqa: E402
+
+CACHE_SIZE = 64
+DPI = 200
+
+COST_LABELS = (
+    "Carne fresca", "Sal", "Corte", "Sueldo princ.", "Trabajador adic.", "Empleado ventas", "Redes sociales",
+    "Luz", "Agua", "Fumigación", "Líquidos limp.", "Otro líquido", "Empaques",
+)
+
+# Pie colors per variant: (cost, profit, loss)
+COMPOSITION_COLORS = {
+    'Actual': ('#FFE4B3', '#C41E3A', '#FF9999'),
+    'Sugerido': ('#E0F7FA', '#F4A261', '#FF9999'),
+}
+
+
+@contextmanager
+def _figure(figsize):
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    try:
+        yield fig
+    finally:
+        # Break the figure's reference cycles so its memory is freed promptly
+        fig.clear()
+
+
+def _encode(fig, fmt):
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=fmt, dpi=DPI, bbox_inches="tight")
+    return buffer.getvalue()
+
+
+def make_autopct(values):
+    def my_autopct(pct):
+        total = sum(values)
+        val = pct * total / 100
+        return f"{val:,.2f}\n({pct:.1f}%)"
+    return my_autopct
+
+
+def draw_cost_breakdown(ax, values):
+    """Draw the "Costos por Rubro" bars on ``ax``; ``values`` follows COST_LABELS."""
+    ax.barh(COST_LABELS, values, color="#C41E3A")
+    ax.set_xlabel("Monto ($)", fontsize=9)
+    ax.set_title("Costos por Rubro", fontsize=11)
+    ax.tick_params(axis='y', labelsize=8)
+    ax.tick_params(axis='x', labelsize=8)
+
+
+def draw_price_composition(ax, costo_por_bolsa, utilidad_por_bolsa, variant):
+    """Draw the cost vs. profit (or loss) pie of ``variant`` on ``ax``."""
+    cost_color, profit_color, loss_color = COMPOSITION_COLORS[variant]
+    labels = ["Costo", "Utilidad"] if utilidad_por_bolsa >= 0 else ["Costo", "Pérdida"]
+    sizes = [costo_por_bolsa, abs(utilidad_por_bolsa)]
+    colors = [cost_color, profit_color] if utilidad_por_bolsa >= 0 else [cost_color, loss_color]
+    ax.pie(
+        sizes,
+        labels=labels,
+        startangle=90,
+        autopct=make_autopct(sizes),
+        colors=colors,
+        textprops={'fontsize': 8}
+    )
+    ax.set_title(variant, fontsize=11)
+    ax.axis('equal')
+
+
+def draw_cost_profit(ax, costo_por_bolsa, utilidad_por_bolsa, utilidad_por_bolsa_sug):
+    """Draw the stacked cost plus profit bars of both prices on ``ax``."""
+    labels_cmp = ["Actual", "Sugerido"]
+    costs_cmp = [costo_por_bolsa, costo_por_bolsa]
+    profits_cmp = [utilidad_por_bolsa, utilidad_por_bolsa_sug]
+    x = np.arange(len(labels_cmp))
+    ax.bar(x, costs_cmp, 0.6, label="Costo", color="#FFE4B3")
+    for i in range(2):
+        bottom = costs_cmp[i] if profits_cmp[i] >= 0 else costs_cmp[i] + profits_cmp[i]
+        color = "#C41E3A" if profits_cmp[i] >= 0 else "#FF9999"
+        ax.bar(x[i], abs(profits_cmp[i]), 0.6, bottom=bottom, color=color)
+    ax.set_xticks(x)
+    ax.set_xticklabels(labels_cmp, fontsize=8)
+    ax.set_ylabel("Monto ($)", fontsize=9)
+    ax.set_title("Costo + Utilidad por Bolsa", fontsize=11)
+    for i in range(2):
+        total = costs_cmp[i] + profits_cmp[i]
+        if total != 0:
+            ax.text(
+                x[i],
+                costs_cmp[i]/2,
+                f"${costs_cmp[i]:.2f}\n({costs_cmp[i]/total*100:.1f}%)",
+                ha="center", va="center", fontsize=8
+            )
+            ax.text(
+                x[i],
+                costs_cmp[i] + profits_cmp[i]/2,
+                f"${profits_cmp[i]:.2f}\n({profits_cmp[i]/total*100:.1f}%)",
+                ha="center", va="center", fontsize=8
+            )
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def cost_breakdown_chart(values, fmt='png'):
+    """Horizontal bars of each cost item; ``values`` follows COST_LABELS."""
+    with _figure((6, 3)) as fig:
+        draw_cost_breakdown(fig.subplots(), values)
+        return _encode(fig, fmt)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def price_composition_chart(costo_por_bolsa, utilidad_por_bolsa, variant, fmt='png'):
+    """Pie of cost vs. profit (or loss) per bag; ``variant`` is 'Actual' or 'Sugerido'."""
+    with _figure((3, 3)) as fig:
+        draw_price_composition(fig.subplots(), costo_por_bolsa, utilidad_por_bolsa, variant)
+        return _encode(fig, fmt)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def cost_profit_chart(costo_por_bolsa, utilidad_por_bolsa, utilidad_por_bolsa_sug, fmt='png'):
+    """Stacked bars of cost plus profit per bag for both prices."""
+    with _figure((5, 2.5)) as fig:
+        draw_cost_profit(fig.subplots(), costo_por_bolsa, utilidad_por_bolsa, utilidad_por_bolsa_sug)
+        return _encode(fig, fmt)
+
+
+def sensitivity_heatmap(datos, grid_total, precios, unidades, punto, titulo, fmt='png'):
+    """Heatmap of a price × volume grid with the break-even contour.
+
+    ``datos`` is the grid shown in color and ``grid_total`` the utilidad_total
+    grid whose zero contour is drawn; ``punto`` is the current (price, units).
+    Not memoized: the grids are already cached by the caller and are large.
+    """
+    limite = max(float(np.nanmax(np.abs(datos))), 1e-9)
+    with _figure((6, 4.5)) as fig:
+        ax = fig.subplots()
+        imagen = ax.imshow(
+            datos,
+            origin="lower",
+            aspect="auto",
+            extent=(precios[0], precios[-1], unidades[0], unidades[-1]),
+            cmap="RdYlGn",
+            vmin=-limite,
+            vmax=limite,
+        )
+        ax.contour(precios, unidades, grid_total, levels=[0], colors="black", linewidths=1.2)
+        ax.plot(*punto, marker="o", color="#C41E3A")
+        cbar = fig.colorbar(imagen, ax=ax)
+        cbar.ax.tick_params(labelsize=8)
+        ax.set_xlabel("Precio por bolsa ($)", fontsize=9)
+        ax.set_ylabel("Bolsas producidas", fontsize=9)
+        ax.set_title(titulo, fontsize=11)
+        ax.tick_params(axis='both', labelsize=8)
+        return _encode(fig, fmt)
+
+
+def profit_histogram(conteos, bordes, fmt='png'):
+    """Histogram of simulated utilidad_total, losses in a lighter red."""
+    centros = (bordes[:-1] + bordes[1:]) / 2
+    with _figure((6, 2.5)) as fig:
+        ax = fig.subplots()
+        ax.bar(centros, conteos, width=np.diff(bordes), color=np.where(centros < 0, "#FF9999", "#C41E3A"))
+        ax.axvline(0, color="black", linewidth=1)
+        ax.set_xlabel("Utilidad total ($)", fontsize=9)
+        ax.set_ylabel("Escenarios", fontsize=9)
+        ax.set_title("Distribución de la utilidad total", fontsize=11)
+        ax.tick_params(axis='both', labelsize=8)
+        return _encode(fig, fmt)
+
+
+def price_optimization_chart(precios, utilidad_total, unidades, optimo, actual=None, fmt='png'):
+    """utilidad_total and demanded bags across candidate prices, optimum marked."""
+    with _figure((6, 2.8)) as fig:
+        ax = fig.subplots()
+        ax.plot(precios, utilidad_total, color="#C41E3A", linewidth=1.5)
+        ax.axhline(0, color="black", linewidth=0.8)
+        ax.axvline(optimo['precio'], color="#FF9999", linestyle="--", linewidth=1)
+        ax.plot([optimo['precio']], [optimo['utilidad_total']], "o", color="#C41E3A", markeredgecolor="black")
+        if actual is not None:
+            ax.axvline(actual, color="gray", linestyle=":", linewidth=1)
+        ax.set_xlabel("Precio por bolsa ($)", fontsize=9)
+        ax.set_ylabel("Utilidad total ($)", fontsize=9)
+        ax.set_title("Utilidad según el precio — punto: óptimo, punteada: precio actual", fontsize=10)
+        ax.tick_params(axis='both', labelsize=8)
+        volumen = ax.twinx()
+        volumen.plot(precios, unidades, color="gray", linewidth=1, alpha=0.6)
+        volumen.set_ylabel("Bolsas vendidas", fontsize=9, color="gray")
+        volumen.tick_params(axis='y', labelsize=8, colors="gray")
+        return _encode(fig, fmt)
@@ -0,0 +1,175 @@
+"""Headless batch pricing with the calculator's cost/profit model.
+
+Runs the same vectorized model as the Streamlit page without importing
+Streamlit, for scheduled jobs on servers without a browser::
+
+    python cli.py escenarios escenarios.csv -o resultados.parquet --workers 8
+    python cli.py versiones --db centro.db --db norte.db -o repricing.csv --margen-objetivo 25
+    python cli.py reporte --db centro.db --db norte.db --desde 2025-01-01 --hasta 2025-12-31 --pdf anual.pdf --xlsx anual.xlsx
+
+``escenarios`` prices every row of a CSV or Parquet file that has the 15
+calculator inputs; other columns are passed through. ``versiones`` re-prices
+every saved version of one or more databases (one per branch). Input is read
+in chunks that are priced in parallel on a process pool, and results are
+written in order, chunk by chunk, so memory stays bounded. ``reporte``
+writes the PDF/Excel report of the versions in a date range (see reports).
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import database
+from calculator import INPUT_FIELDS, METRIC_FIELDS, break_even, compute_metrics, price_for_margin
+
+DEFAULT_CHUNK_SIZE = 50_000
+
+
+def price_chunk(frame, margen_objetivo=None):
+    """Append every metric, and break-even values, to a frame of inputs."""
+    missing = [field for field in INPUT_FIELDS if field not in frame]
+    if missing:
+        raise ValueError(f"Faltan columnas: {', '.join(missing)}")
+    inputs = {field: frame[field].to_numpy(dtype=float) for field in INPUT_FIELDS}
+    metrics = compute_metrics(inputs)
+    result = frame.copy()
+    for name in METRIC_FIELDS:
+        result[name] = metrics[name]
+    equilibrio = break_even(inputs, margen_objetivo or 0.0)
+    for name in ('precio_equilibrio', 'unidades_equilibrio', 'margen_seguridad', 'unidades_equilibrio_sug', 'margen_seguridad_sug'):
+        result[name] = equilibrio[name]
+    if margen_objetivo is not None:
+        result['precio_margen_objetivo'] = price_for_margin(margen_objetivo, metrics['costo_por_bolsa'])
+        result['carne_max_margen_objetivo'] = equilibrio['carne_max']
+    return result
+
+
+class _ResultWriter:
+    """Append DataFrames to a CSV or Parquet file as they are produced."""
+
+    def __init__(self, destination):
+        self.destination = destination
+        self.format = database.file_format(destination)
+        self._parquet = None
+        self._started = False
+        self.rows = 0
+
+    def write(self, frame):
+        if self.format == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self._parquet is None:
+                self._parquet = pq.ParquetWriter(self.destination, table.schema)
+            self._parquet.write_table(table.cast(self._parquet.schema))
+        else:
+            frame.to_csv(self.destination, mode='a' if self._started else 'w', header=not self._started, index=False)
+        self._started = True
+        self.rows += len(frame)
+
+    def close(self):
+        if self._parquet is not None:
+            self._parquet.close()
+
+
+def _price_all(chunks, writer, workers, margen_objetivo):
+    if workers <= 1:
+        for chunk in chunks:
+            writer.write(price_chunk(chunk, margen_objetivo))
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Keep at most 2 chunks per worker in flight so a huge file is never fully read ahead
+        pending = []
+        for chunk in chunks:
+            pending.append(pool.submit(price_chunk, chunk, margen_objetivo))
+            if len(pending) >= 2 * workers:
+                writer.write(pending.pop(0).result())
+        for future in pending:
+            writer.write(future.result())
+
+
+def _version_chunks(paths, chunk_size):
+    for path in paths:
+        database.configure(path)
+        conn = database.get_connection()
+        sucursal = os.path.splitext(os.path.basename(path))[0]
+        for chunk in pd.read_sql_query(
+            'SELECT * FROM calculation_versions ORDER BY created_date, id', conn, chunksize=chunk_size
+        ):
+            chunk.insert(0, 'sucursal', sucursal)
+            yield chunk
+
+
+def _report_rows(paths, desde, hasta):
+    for path in paths:
+        sucursal = os.path.splitext(os.path.basename(path))[0]
+        database.configure(path)
+        for row in database.iter_versions():
+            # created_date is ISO formatted, so string order is date order
+            if (desde is None or row['created_date'] >= desde) and (hasta is None or row['created_date'][:10] <= hasta):
+                yield dict(row, sucursal=sucursal)
+
+
+def main(argv=None):
+    # Options shared by the subcommands, accepted after the subcommand name
+    comunes = argparse.ArgumentParser(add_help=False)
+    comunes.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="procesos en paralelo (1 = sin pool)")
+    calculo = argparse.ArgumentParser(add_help=False, parents=[comunes])
+    calculo.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="filas por bloque")
+    calculo.add_argument('--margen-objetivo', type=float, help="margen %% para el precio y la carne máxima objetivo")
+
+    parser = argparse.ArgumentParser(description="Cálculo de costos y utilidad por lotes, sin interfaz.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    escenarios = subparsers.add_parser('escenarios', parents=[calculo], help="calcular cada fila de un archivo CSV o Parquet")
+    escenarios.add_argument('entrada', help="archivo con las 15 columnas de la calculadora")
+    escenarios.add_argument('-o', '--salida', required=True, help="archivo de resultados (.csv o .parquet)")
+
+    versiones = subparsers.add_parser('versiones', parents=[calculo], help="recalcular todas las versiones guardadas")
+    versiones.add_argument('--db', action='append', default=None, help="base de datos; se puede repetir (una por sucursal)")
+    versiones.add_argument('-o', '--salida', required=True, help="archivo de resultados (.csv o .parquet)")
+
+    reporte = subparsers.add_parser('reporte', parents=[comunes], help="reporte PDF y/o Excel de las versiones guardadas")
+    reporte.add_argument('--db', action='append', default=None, help="base de datos; se puede repetir (una por sucursal)")
+    reporte.add_argument('--desde', help="primera fecha incluida (AAAA-MM-DD)")
+    reporte.add_argument('--hasta', help="última fecha incluida (AAAA-MM-DD)")
+    reporte.add_argument('--pdf', help="archivo PDF, una página por versión")
+    reporte.add_argument('--xlsx', help="libro de Excel, una fila por versión")
+
+    args = parser.parse_args(argv)
+    if args.command in ('versiones', 'reporte'):
+        args.db = args.db or [database.DB_PATH]
+        # configure() would create and migrate an empty database for a mistyped path
+        faltantes = [path for path in args.db if not os.path.exists(path)]
+        if faltantes:
+            parser.error(f"no existe la base de datos: {', '.join(faltantes)}")
+    if args.command == 'reporte':
+        if not (args.pdf or args.xlsx):
+            parser.error("indica --pdf y/o --xlsx")
+        import reports
+
+        rows = _report_rows(args.db, args.desde, args.hasta)
+        total = reports.build_reports(rows, args.pdf, args.xlsx, workers=args.workers, sucursal=True)
+        print(f"{total} versiones en el reporte", file=sys.stderr)
+        return
+
+    if args.command == 'escenarios':
+        chunks = database.read_chunks(args.entrada, chunk_size=args.chunk_size)
+    else:
+        chunks = _version_chunks(args.db, args.chunk_size)
+
+    writer = _ResultWriter(args.salida)
+    try:
+        _price_all(chunks, writer, args.workers, args.margen_objetivo)
+    except ValueError as e:
+        parser.exit(1, f"error: {e}\n")
+    finally:
+        writer.close()
+    print(f"{writer.rows} filas escritas en {args.salida}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,978 @@
+"""SQLite persistence for saved calculation versions.
+
+All sessions in a process share one connection, opened lazily in WAL mode.
+Schema migrations run once, when that connection is opened, not on every
+rerun. Reads of the version list and of single versions are memoized.
+Each version also stores its derived metrics, indexed, so the versions page
+sorts, filters and aggregates them in SQL. Version names are indexed with
+FTS5 for search_versions().
+
+Writes from every session go through a single writer thread with its own
+connection. Whatever is queued when it wakes up is applied as one group
+commit, each write in its own savepoint so a failing write doesn't sink the
+others. Lock errors from other processes are retried with bounded
+exponential backoff. The submit_* functions return a Future for the UI, and
+the plain save/delete/import functions wait on it. After each commit the
+caches are cleared and the listeners registered with add_listener() are
+notified, so in-memory views of the table stay up to date.
+"""
+import csv
+import logging
+import os
+import queue
+import random
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from concurrent.futures import Future
+from contextlib import nullcontext
+from datetime import datetime
+from functools import lru_cache
+
+DB_PATH = os.environ.get('VAQUITA_DB_PATH', 'machaca_calculator.db')
+
+PAGE_SIZE = 50
+IMPORT_CHUNK_SIZE = 10_000
+EXPORT_CHUNK_SIZE = 5_000
+
+# Group commits take at most this many queued writes
+WRITE_BATCH_SIZE = 256
+# Retries of a group commit that hit "database is locked", with backoff
+# doubling from WRITE_BACKOFF up to WRITE_BACKOFF_MAX seconds
+WRITE_RETRIES = 6
+WRITE_BACKOFF = 0.05
+WRITE_BACKOFF_MAX = 2.0
+
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA busy_timeout=5000',
+    'PRAGMA cache_size=-16000',
+    'PRAGMA temp_store=MEMORY',
+)
+
+# Guards the shared connection; sqlite3 connections must not run statements
+# from two threads at once.
+_lock = threading.RLock()
+_connection = None
+
+# Callables notified after each committed write, see add_listener()
+_listeners = []
+
+_writer = None
+
+logger = logging.getLogger('vaquita.database')
+
+# Derived metrics stored with each version, so the versions page can filter,
+# sort and aggregate them in SQL. Filled on save and import; migration 4
+# computes them for older rows.
+STORED_METRICS = (
+    'costo_total',
+    'costo_por_bolsa',
+    'utilidad_total',
+    'utilidad_pct',
+    'utilidad_total_sug',
+    'utilidad_pct_sug',
+)
+
+# Columns of the rows returned by get_versions_page()
+PAGE_COLUMNS = ('id', 'version_name', 'created_date') + STORED_METRICS
+SORT_COLUMNS = ('created_date',) + STORED_METRICS
+# Columns of the rows returned by search_versions()
+SEARCH_COLUMNS = PAGE_COLUMNS + ('rank',)
+
+BACKFILL_CHUNK_SIZE = 10_000
+
+# Fuzzy search: similar index terms tried per misspelled word, and how
+# similar they must be (difflib ratio)
+FUZZY_TERMS = 5
+FUZZY_CUTOFF = 0.7
+# Searches matching more versions than this aren't ranked, since bm25 would
+# score every match on every page; they come newest first instead
+RANKED_MATCHES = 2_000
+
+
+def derived_metrics(inputs):
+    """STORED_METRICS of one or many versions, ready to bind.
+
+    ``inputs`` maps the calculator inputs to scalars or arrays. Returns a
+    float per metric, or a list of them for arrays, with NaN (no costs and
+    no units) as None.
+    """
+    import numpy as np
+
+    from calculator import compute_metrics
+
+    metrics = compute_metrics(inputs)
+    result = {}
+    for name in STORED_METRICS:
+        values = np.asarray(metrics[name], dtype=np.float64)
+        bound = values.astype(object)
+        bound[np.isnan(values)] = None
+        result[name] = bound.tolist()
+    return result
+
+
+def _add_missing_input_columns(conn):
+    # The first release had no empleado_ventas or redes_sociales columns
+    existing = {row[1] for row in conn.execute('PRAGMA table_info(calculation_versions)')}
+    for column in ('empleado_ventas', 'redes_sociales'):
+        if column not in existing:
+            conn.execute(f'ALTER TABLE calculation_versions ADD COLUMN {column} REAL DEFAULT 0')
+
+
+def _add_metric_columns(conn):
+    import numpy as np
+
+    from calculator import INPUT_FIELDS
+
+    existing = {row[1] for row in conn.execute('PRAGMA table_info(calculation_versions)')}
+    for column in STORED_METRICS:
+        if column not in existing:
+            conn.execute(f'ALTER TABLE calculation_versions ADD COLUMN {column} REAL')
+    update = (
+        f"UPDATE calculation_versions SET {', '.join(f'{name} = ?' for name in STORED_METRICS)} WHERE id = ?"
+    )
+    # Backfill in id order, one vectorized pass per chunk
+    last = 0
+    while rows := conn.execute(f'''
+        SELECT id, {', '.join(INPUT_FIELDS)} FROM calculation_versions
+        WHERE id > ? ORDER BY id LIMIT ?
+    ''', (last, BACKFILL_CHUNK_SIZE)).fetchall():
+        values = np.array(rows, dtype=np.float64)
+        # Missing inputs count as 0, as everywhere else
+        inputs = {field: np.nan_to_num(values[:, i + 1]) for i, field in enumerate(INPUT_FIELDS)}
+        metrics = derived_metrics(inputs)
+        ids = [row[0] for row in rows]
+        conn.executemany(update, zip(*(metrics[name] for name in STORED_METRICS), ids))
+        last = ids[-1]
+
+
+def _create_search_index(conn):
+    # External-content FTS5 index over version_name, kept in sync by triggers.
+    # remove_diacritics 2 folds "Cálculo" and "calculo" to the same term.
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS versions_fts USING fts5(
+            version_name,
+            content='calculation_versions',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS versions_fts_insert AFTER INSERT ON calculation_versions BEGIN
+            INSERT INTO versions_fts (rowid, version_name) VALUES (new.id, new.version_name);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS versions_fts_delete AFTER DELETE ON calculation_versions BEGIN
+            INSERT INTO versions_fts (versions_fts, rowid, version_name) VALUES ('delete', old.id, old.version_name);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS versions_fts_update AFTER UPDATE OF version_name ON calculation_versions BEGIN
+            INSERT INTO versions_fts (versions_fts, rowid, version_name) VALUES ('delete', old.id, old.version_name);
+            INSERT INTO versions_fts (rowid, version_name) VALUES (new.id, new.version_name);
+        END
+    ''')
+    conn.execute("INSERT INTO versions_fts (versions_fts) VALUES ('rebuild')")
+    # One row per distinct term, for the fuzzy search
+    conn.execute('CREATE VIRTUAL TABLE IF NOT EXISTS versions_fts_terms USING fts5vocab(versions_fts, row)')
+
+
+def _index_metric_columns(conn):
+    # With id as tiebreaker, for keyset pagination in any sort order
+    for column in STORED_METRICS:
+        conn.execute(f'CREATE INDEX IF NOT EXISTS idx_versions_{column} ON calculation_versions ({column}, id)')
+
+
+def _create_version_totals(conn):
+    # One row with the count of versions and, per metric, how many are set and
+    # their sum, kept current by triggers so unfiltered stats don't scan the table
+    columns = ', '.join(f'n_{name} INTEGER NOT NULL, s_{name} REAL NOT NULL' for name in STORED_METRICS)
+    conn.execute(f'CREATE TABLE version_totals (id INTEGER PRIMARY KEY CHECK (id = 1), versiones INTEGER NOT NULL, {columns})')
+    conn.execute(f'''
+        INSERT INTO version_totals
+        SELECT 1, COUNT(*), {', '.join(f'COUNT({name}), TOTAL({name})' for name in STORED_METRICS)}
+        FROM calculation_versions
+    ''')
+
+    def change(row, sign):
+        return ', '.join(
+            f'n_{name} = n_{name} {sign} ({row}.{name} IS NOT NULL), s_{name} = s_{name} {sign} COALESCE({row}.{name}, 0)'
+            for name in STORED_METRICS
+        )
+
+    conn.execute(f'''
+        CREATE TRIGGER version_totals_insert AFTER INSERT ON calculation_versions BEGIN
+            UPDATE version_totals SET versiones = versiones + 1, {change('new', '+')};
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER version_totals_delete AFTER DELETE ON calculation_versions BEGIN
+            UPDATE version_totals SET versiones = versiones - 1, {change('old', '-')};
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER version_totals_update AFTER UPDATE OF {', '.join(STORED_METRICS)} ON calculation_versions BEGIN
+            UPDATE version_totals SET {change('old', '-')};
+            UPDATE version_totals SET {change('new', '+')};
+        END
+    ''')
+
+
+# Schema migrations, applied in order. PRAGMA user_version records how many
+# have run, so each entry must stay in place once released; add new ones at
+# the end. Entries are SQL statements or callables taking the connection.
+MIGRATIONS = (
+    # 1. Base table; databases created before migrations already have it
+    '''
+        CREATE TABLE IF NOT EXISTS calculation_versions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            version_name TEXT NOT NULL,
+            created_date TEXT NOT NULL,
+            carne_fresca REAL,
+            sal REAL,
+            sueldo1 REAL,
+            trabajador_adicional REAL,
+            empleado_ventas REAL,
+            redes_sociales REAL,
+            corte_carne REAL,
+            luz REAL,
+            agua REAL,
+            fumigacion REAL,
+            liquidos_limpieza REAL,
+            otro_liquido REAL,
+            total_unidades INTEGER,
+            precio_venta REAL,
+            precio_venta_sugerido REAL
+        )
+    ''',
+    # 2. Inputs added after the first release
+    _add_missing_input_columns,
+    # 3. Keyset pagination of the versions page
+    '''
+        CREATE INDEX IF NOT EXISTS idx_versions_created
+        ON calculation_versions (created_date DESC, id DESC)
+    ''',
+    # 4. Stored derived metrics, computed for existing versions
+    _add_metric_columns,
+    # 5. Sorting and filtering by those metrics
+    _index_metric_columns,
+    # 6. Full-text search over the version names
+    _create_search_index,
+    # 7. Running totals for version_stats()
+    _create_version_totals,
+)
+
+
+def migrate(conn, migrations=MIGRATIONS):
+    """Apply pending migrations in a single transaction.
+
+    Up-to-date databases cost a single PRAGMA read. The version is re-read
+    after taking the write lock, so concurrent processes starting at the same
+    time apply each migration only once. Other databases of the app pass
+    their own ``migrations`` sequence.
+    """
+    if conn.execute('PRAGMA user_version').fetchone()[0] >= len(migrations):
+        return
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        for migration in migrations[version:]:
+            if callable(migration):
+                migration(conn)
+            else:
+                conn.execute(migration)
+        conn.execute(f'PRAGMA user_version = {len(migrations)}')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def _open_connection():
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def get_connection():
+    """Return the process-wide connection, opening it on first use."""
+    global _connection
+    with _lock:
+        if _connection is None:
+            conn = _open_connection()
+            migrate(conn)
+            _connection = conn
+        return _connection
+
+
+def _open_side_connection():
+    # A second connection for the writer or a streaming read. Opening the
+    # shared one first runs any pending migrations before it touches the file.
+    get_connection()
+    return _open_connection()
+
+
+def configure(path):
+    """Point the module at another database file, e.g. for the CLI or benchmarks."""
+    global DB_PATH, _connection
+    if _writer is not None:
+        # Queued writes belong to the current file; the writer reopens on the new one
+        _writer.submit(lambda conn: (None, ())).result()
+    with _lock:
+        if _connection is not None:
+            _connection.close()
+            _connection = None
+        DB_PATH = path
+        invalidate_caches()
+    _notify('reset')
+
+
+def add_listener(callback):
+    """Register ``callback(event, payload)`` to be called after each write.
+
+    Events are ``'save'`` with the new row as a dict, ``'delete'`` with the
+    list of deleted ids, and ``'reset'`` (payload None) after bulk imports or
+    a change of database, when listeners should reload from scratch.
+    """
+    _listeners.append(callback)
+
+
+def _notify(event, payload=None):
+    # The write is already committed; a failing listener must not undo that
+    for callback in _listeners:
+        try:
+            callback(event, payload)
+        except Exception:
+            logger.exception("Error en el listener %r del evento %r", callback, event)
+
+
+def invalidate_caches():
+    """Drop every memoized read; called after each write."""
+    _get_all_versions.cache_clear()
+    _get_version_data.cache_clear()
+    _get_all_version_inputs.cache_clear()
+    _get_versions_page.cache_clear()
+    _count_versions.cache_clear()
+    _version_stats.cache_clear()
+    _search_versions.cache_clear()
+
+
+def _is_locked(error):
+    return isinstance(error, sqlite3.OperationalError) and (
+        'locked' in str(error) or 'busy' in str(error)
+    )
+
+
+class _Writer(threading.Thread):
+    """The only thread that writes to the database; applies queued writes in group commits."""
+
+    def __init__(self):
+        super().__init__(name='vaquita-db-writer', daemon=True)
+        self._queue = queue.Queue()
+        self._conn = None
+        self._path = None
+
+    def submit(self, write):
+        """Queue ``write(conn) -> (result, notifications)``; returns its Future."""
+        future = Future()
+        self._queue.put((write, future))
+        return future
+
+    def _connection(self):
+        if DB_PATH == ':memory:':
+            # A private in-memory connection would be a different database
+            return get_connection()
+        if self._conn is None or self._path != DB_PATH:
+            if self._conn is not None:
+                self._conn.close()
+            self._conn, self._path = _open_side_connection(), DB_PATH
+        return self._conn
+
+    def _commit(self, batch):
+        conn = self._connection()
+        with _lock if conn is _connection else nullcontext():
+            outcomes = []
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                for write, future in batch:
+                    conn.execute('SAVEPOINT write')
+                    try:
+                        outcome = write(conn)
+                    except Exception as e:
+                        if _is_locked(e):
+                            raise
+                        conn.execute('ROLLBACK TO write')
+                        outcome = e
+                    conn.execute('RELEASE write')
+                    outcomes.append((future, outcome))
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+        return outcomes
+
+    def _apply(self, batch):
+        for attempt in range(WRITE_RETRIES + 1):
+            try:
+                outcomes = self._commit(batch)
+                break
+            except Exception as e:
+                if not _is_locked(e) or attempt == WRITE_RETRIES:
+                    for _, future in batch:
+                        future.set_exception(e)
+                    return
+                delay = min(WRITE_BACKOFF_MAX, WRITE_BACKOFF * 2 ** attempt)
+                logger.warning("Base de datos bloqueada; reintento %d en %.2f s", attempt + 1, delay)
+                time.sleep(delay * random.uniform(0.5, 1.0))
+        with _lock:
+            invalidate_caches()
+        for future, outcome in outcomes:
+            if isinstance(outcome, Exception):
+                future.set_exception(outcome)
+                continue
+            result, notifications = outcome
+            for event, payload in notifications:
+                _notify(event, payload)
+            future.set_result(result)
+
+    def run(self):
+        while True:
+            batch = [self._queue.get()]
+            # Group commit: take whatever else is already waiting
+            while len(batch) < WRITE_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+            if batch:
+                self._apply(batch)
+
+
+def _get_writer():
+    global _writer
+    with _lock:
+        if _writer is None:
+            _writer = _Writer()
+            _writer.start()
+        return _writer
+
+
+def _insert_version(row):
+    def write(conn):
+        cursor = conn.execute(f'''
+            INSERT INTO calculation_versions ({', '.join(row)})
+            VALUES ({', '.join(':' + column for column in row)})
+        ''', row)
+        saved = dict(row, id=cursor.lastrowid)
+        return saved['id'], [('save', saved)]
+    return write
+
+
+def submit_save(version_name, data):
+    """Queue a new calculation version; the Future resolves to its id."""
+    row = {
+        'version_name': version_name,
+        'created_date': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    row.update((field, data[field]) for field in (
+        'carne_fresca', 'sal', 'sueldo1', 'trabajador_adicional', 'empleado_ventas', 'redes_sociales',
+        'corte_carne', 'luz', 'agua', 'fumigacion', 'liquidos_limpieza', 'otro_liquido',
+        'total_unidades', 'precio_venta', 'precio_venta_sugerido',
+    ))
+    row.update(derived_metrics(row))
+    return _get_writer().submit(_insert_version(row))
+
+
+def save_calculation(version_name, data):
+    """Save a calculation version to the database and return its id."""
+    return submit_save(version_name, data).result()
+
+
+@lru_cache(maxsize=1)
+def _get_all_versions():
+    with _lock:
+        cursor = get_connection().execute('''
+            SELECT id, version_name, created_date FROM calculation_versions
+            ORDER BY created_date DESC
+        ''')
+        return tuple(cursor.fetchall())
+
+
+# The public readers consult the caches under _lock, so a read can't store
+# a result computed before a commit after the writer has cleared the caches.
+def get_all_versions():
+    """Get all saved calculation versions."""
+    with _lock:
+        return _get_all_versions()
+
+
+@lru_cache(maxsize=1)
+def _count_versions():
+    with _lock:
+        return get_connection().execute('SELECT COUNT(*) FROM calculation_versions').fetchone()[0]
+
+
+def count_versions():
+    """Get the number of saved versions."""
+    with _lock:
+        return _count_versions()
+
+
+def _filter_clauses(filters):
+    # ``filters`` holds (column, minimum, maximum) ranges; None leaves a side open
+    clauses, params = [], []
+    for column, minimum, maximum in filters:
+        if column not in STORED_METRICS:
+            raise ValueError(f"Columna no filtrable: {column}")
+        if minimum is not None:
+            clauses.append(f'{column} >= ?')
+            params.append(minimum)
+        if maximum is not None:
+            clauses.append(f'{column} <= ?')
+            params.append(maximum)
+    return clauses, params
+
+
+@lru_cache(maxsize=64)
+def _get_versions_page(after, limit, order, descending, filters):
+    if order not in SORT_COLUMNS:
+        raise ValueError(f"Columna no ordenable: {order}")
+    clauses, params = _filter_clauses(filters)
+    if order != 'created_date':
+        # NULL doesn't compare in the keyset condition
+        clauses.append(f'{order} IS NOT NULL')
+    if after is not None:
+        clauses.append(f'({order}, id) {"<" if descending else ">"} (?, ?)')
+        params.extend(after)
+    direction = 'DESC' if descending else 'ASC'
+    with _lock:
+        cursor = get_connection().execute(f'''
+            SELECT {', '.join(PAGE_COLUMNS)} FROM calculation_versions
+            {'WHERE ' + ' AND '.join(clauses) if clauses else ''}
+            ORDER BY {order} {direction}, id {direction}
+            LIMIT ?
+        ''', (*params, limit))
+        return tuple(cursor.fetchall())
+
+
+def get_versions_page(after=None, limit=PAGE_SIZE, order='created_date', descending=True, filters=()):
+    """Get one page of versions using keyset pagination.
+
+    Rows hold PAGE_COLUMNS, sorted by ``order`` (one of SORT_COLUMNS, newest
+    first by default) and then id. ``after`` is the ``(order value, id)`` of
+    the last row of the previous page, or None for the first page.
+    ``filters`` is a tuple of ``(column, minimum, maximum)`` ranges on
+    STORED_METRICS. Every sort column is indexed together with id, so a page
+    is an index range scan whose cost doesn't grow with the number of stored
+    versions. Versions without a value for a metric are left out when sorting by it.
+    """
+    with _lock:
+        return _get_versions_page(after, limit, order, descending, tuple(filters))
+
+
+@lru_cache(maxsize=16)
+def _version_stats(filters):
+    clauses, params = _filter_clauses(filters)
+    if clauses:
+        aggregates = ', '.join(f'AVG({name}), MIN({name}), MAX({name})' for name in STORED_METRICS)
+        query = f"SELECT COUNT(*), {aggregates} FROM calculation_versions WHERE {' AND '.join(clauses)}"
+    else:
+        # Averages from the running totals, extremes from the ends of each metric's index
+        aggregates = ', '.join(
+            f's_{name} / NULLIF(n_{name}, 0), (SELECT MIN({name}) FROM calculation_versions), '
+            f'(SELECT MAX({name}) FROM calculation_versions)'
+            for name in STORED_METRICS
+        )
+        query = f'SELECT versiones, {aggregates} FROM version_totals'
+    with _lock:
+        row = get_connection().execute(query, params).fetchone()
+    stats = {'versiones': row[0]}
+    for i, name in enumerate(STORED_METRICS):
+        stats[name] = dict(zip(('promedio', 'minimo', 'maximo'), row[1 + 3 * i:4 + 3 * i]))
+    return stats
+
+
+def version_stats(filters=()):
+    """Count, and average/min/max of each of STORED_METRICS, in one query.
+
+    Without ``filters`` the count and averages come from running totals kept
+    by triggers and the extremes from the metric indexes, so the cost doesn't
+    depend on the number of versions. With ``filters``, the same as for
+    get_versions_page(), the matching rows are scanned, which is O(n).
+    Returns ``{'versiones': n, metric: {'promedio', 'minimo', 'maximo'}, ...}``.
+    """
+    with _lock:
+        stats = _version_stats(tuple(filters))
+    return {name: dict(value) if isinstance(value, dict) else value for name, value in stats.items()}
+
+
+def _fold(text):
+    # Same folding as the index tokenizer: lower case, no diacritics
+    return ''.join(c for c in unicodedata.normalize('NFKD', text.lower()) if not unicodedata.combining(c))
+
+
+def _similar_terms(conn, word):
+    # Index terms close to ``word``. Only terms with the same first letter are
+    # compared, which keeps the vocabulary scan to a narrow range.
+    import difflib
+
+    candidates = [
+        row[0] for row in conn.execute(
+            'SELECT term FROM versions_fts_terms WHERE term >= ? AND term < ?', (word[0], chr(ord(word[0]) + 1))
+        )
+        if abs(len(row[0]) - len(word)) <= 2
+    ]
+    return difflib.get_close_matches(word, candidates, n=FUZZY_TERMS, cutoff=FUZZY_CUTOFF)
+
+
+def _count_matches(conn, expression, filters, limit):
+    # Versions matching ``expression``, counted no further than ``limit``
+    clauses, params = _filter_clauses(filters)
+    return conn.execute(f'''
+        SELECT count(*) FROM (
+            SELECT 1 FROM versions_fts JOIN calculation_versions v ON v.id = versions_fts.rowid
+            WHERE versions_fts MATCH ? {''.join(' AND v.' + clause for clause in clauses)}
+            LIMIT ?
+        )
+    ''', (expression, *params, limit)).fetchone()[0]
+
+
+def _search(conn, expression, filters, limit, after):
+    clauses, params = _filter_clauses(filters)
+    where = f"versions_fts MATCH ? {''.join(' AND v.' + clause for clause in clauses)}"
+    columns = ', '.join(f'v.{column}' for column in PAGE_COLUMNS)
+    if _count_matches(conn, expression, filters, RANKED_MATCHES + 1) > RANKED_MATCHES:
+        # Keyset on id alone, which the index walks in order and stops after ``limit``
+        keyset, keys = '', ()
+        if after is not None:
+            keyset, keys = 'AND versions_fts.rowid < ?', (after[1],)
+        cursor = conn.execute(f'''
+            SELECT {columns}, NULL AS rank
+            FROM versions_fts JOIN calculation_versions v ON v.id = versions_fts.rowid
+            WHERE {where} {keyset}
+            ORDER BY versions_fts.rowid DESC
+            LIMIT ?
+        ''', (expression, *params, *keys, limit))
+        return tuple(cursor.fetchall())
+    # Keyset on (rank, id): best rank first, newest id first among equal ranks
+    keyset, keys = '', ()
+    if after is not None:
+        keyset = 'WHERE rank > ? OR (rank = ? AND id < ?)'
+        keys = (after[0], after[0], after[1])
+    cursor = conn.execute(f'''
+        SELECT * FROM (
+            SELECT {columns}, versions_fts.rank AS rank
+            FROM versions_fts JOIN calculation_versions v ON v.id = versions_fts.rowid
+            WHERE {where}
+        )
+        {keyset}
+        ORDER BY rank, id DESC
+        LIMIT ?
+    ''', (expression, *params, *keys, limit))
+    return tuple(cursor.fetchall())
+
+
+@lru_cache(maxsize=64)
+def _search_versions(query, filters, limit, after):
+    words = re.findall(r'\w+', _fold(query))
+    if not words:
+        return (), False
+    with _lock:
+        conn = get_connection()
+        # Every word must match, as typed or as the start of a longer word
+        exact = ' AND '.join(f'"{word}"*' for word in words)
+        if _count_matches(conn, exact, filters, 1):
+            return _search(conn, exact, filters, limit, after), False
+        # Nothing matched; let each word also match similar index terms
+        alternatives = [
+            '(' + ' OR '.join([f'"{word}"*'] + [f'"{term}"' for term in _similar_terms(conn, word)]) + ')'
+            for word in words
+        ]
+        return _search(conn, ' AND '.join(alternatives), filters, limit, after), True
+
+
+def search_versions(query, filters=(), limit=PAGE_SIZE, after=None):
+    """Find versions by name with the FTS5 index, best matches first.
+
+    Matching ignores case and accents ("calculo" finds "Cálculo") and each
+    word also matches as a prefix ("ene" finds "Enero"). When nothing matches,
+    misspelled words are retried with similar terms of the index. Rows hold
+    SEARCH_COLUMNS, PAGE_COLUMNS followed by the match's rank (lower is
+    better). A search with more than RANKED_MATCHES matches isn't ranked: its
+    rows come newest first, with a rank of None. Results are paged like
+    get_versions_page(): ``after`` is the ``(rank, id)`` of the last row of
+    the previous page, or None for the first page. ``filters`` is as for
+    get_versions_page(). Returns ``(rows, fuzzy)`` with ``fuzzy`` True when
+    the rows come from that retry.
+    """
+    with _lock:
+        return _search_versions(query, tuple(filters), limit, after)
+
+
+@lru_cache(maxsize=256)
+def _get_version_data(version_id):
+    with _lock:
+        cursor = get_connection().execute('''
+            SELECT * FROM calculation_versions WHERE id = ?
+        ''', (version_id,))
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    return dict(zip((column[0] for column in cursor.description), row))
+
+
+def get_version_data(version_id):
+    """Get data for a specific version as a dict keyed by column name."""
+    with _lock:
+        data = _get_version_data(version_id)
+    # Hand out a copy so callers can't mutate the cached row
+    return dict(data) if data is not None else None
+
+
+@lru_cache(maxsize=1)
+def _get_all_version_inputs():
+    import pandas as pd
+
+    with _lock:
+        return pd.read_sql_query(
+            'SELECT * FROM calculation_versions ORDER BY created_date DESC', get_connection()
+        )
+
+
+def get_all_version_inputs():
+    """Get every saved version with all its inputs as a DataFrame of its own."""
+    with _lock:
+        return _get_all_version_inputs().copy()
+
+
+def get_version_input_arrays():
+    """Ids, creation dates and inputs of every version as NumPy arrays, oldest first.
+
+    Returns ``(ids, created_date, inputs)``: an int64 array, a datetime64[s]
+    array and a float array with one column per INPUT_FIELDS entry, missing
+    values as NaN. Unlike get_all_version_inputs() this doesn't need pandas.
+    """
+    import numpy as np
+
+    from calculator import INPUT_FIELDS
+
+    with _lock:
+        rows = get_connection().execute(
+            f'SELECT id, created_date, {", ".join(INPUT_FIELDS)} FROM calculation_versions ORDER BY created_date, id'
+        ).fetchall()
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    dates = np.array([row[1] for row in rows], dtype='datetime64[s]')
+    inputs = np.array([row[2:] for row in rows], dtype=np.float64).reshape(len(rows), len(INPUT_FIELDS))
+    return ids, dates, inputs
+
+
+def iter_versions(ids=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield versions as dicts keyed by column name, oldest first.
+
+    ``ids`` restricts the rows to those versions. Like export_versions, rows
+    are fetched ``chunk_size`` at a time through a separate connection.
+    """
+    import json
+
+    conn = _open_side_connection()
+    try:
+        if ids is None:
+            cursor = conn.execute('SELECT * FROM calculation_versions ORDER BY created_date, id')
+        else:
+            # One JSON parameter instead of one placeholder per id
+            cursor = conn.execute('''
+                SELECT * FROM calculation_versions
+                WHERE id IN (SELECT value FROM json_each(?))
+                ORDER BY created_date, id
+            ''', (json.dumps([int(version_id) for version_id in ids]),))
+        header = [column[0] for column in cursor.description]
+        while rows := cursor.fetchmany(chunk_size):
+            for row in rows:
+                yield dict(zip(header, row))
+    finally:
+        conn.close()
+
+
+def delete_version(version_id):
+    """Delete a specific version."""
+    delete_versions([version_id])
+
+
+def submit_delete(version_ids):
+    """Queue the deletion of several versions, applied together."""
+    version_ids = list(version_ids)
+
+    def write(conn):
+        conn.executemany('DELETE FROM calculation_versions WHERE id = ?', [(version_id,) for version_id in version_ids])
+        return None, [('delete', version_ids)]
+    return _get_writer().submit(write)
+
+
+def delete_versions(version_ids):
+    """Delete several versions in a single transaction."""
+    submit_delete(version_ids).result()
+
+
+def file_format(source, fmt=None):
+    """Return ``fmt`` or, when it is None, 'parquet' or 'csv' from the file name."""
+    if fmt is not None:
+        return fmt
+    name = source if isinstance(source, str) else getattr(source, 'name', '')
+    return 'parquet' if str(name).lower().endswith('.parquet') else 'csv'
+
+
+def read_chunks(source, fmt=None, chunk_size=IMPORT_CHUNK_SIZE):
+    """Yield a CSV or Parquet file as DataFrames of at most ``chunk_size`` rows."""
+    import pandas as pd
+
+    if file_format(source, fmt) == 'parquet':
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(source).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(source, chunksize=chunk_size)
+
+
+def validate_versions(frame):
+    """Validate imported rows in one vectorized pass.
+
+    Returns ``(rows, rejected)``. ``rows`` holds the valid rows, ready to
+    insert, with inputs coerced to numbers and created_date normalized (or set
+    to now when the column is absent). ``rejected`` holds the other rows with
+    a ``motivo`` column. Raises ValueError when required columns are missing.
+    """
+    import pandas as pd
+
+    from calculator import INPUT_FIELDS
+
+    missing = [column for column in ('version_name',) + INPUT_FIELDS if column not in frame]
+    if missing:
+        raise ValueError(f"Faltan columnas: {', '.join(missing)}")
+
+    rows = pd.DataFrame({'version_name': frame['version_name'].astype('string').str.strip()})
+    if 'created_date' in frame:
+        fechas = pd.to_datetime(frame['created_date'], errors='coerce')
+        rows['created_date'] = fechas.dt.strftime("%Y-%m-%d %H:%M:%S")
+    else:
+        rows['created_date'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    for field in INPUT_FIELDS:
+        rows[field] = pd.to_numeric(frame[field], errors='coerce')
+
+    numbers = rows[list(INPUT_FIELDS)]
+    motivo = pd.Series('', index=rows.index)
+    motivo = motivo.mask(rows['total_unidades'].notna() & ((rows['total_unidades'] < 1) | (rows['total_unidades'] % 1 != 0)),
+                         "total_unidades debe ser un entero ≥ 1")
+    motivo = motivo.mask((numbers < 0).any(axis=1), "valores negativos")
+    motivo = motivo.mask(numbers.isna().any(axis=1), "valores no numéricos o vacíos")
+    motivo = motivo.mask(rows['created_date'].isna(), "fecha inválida")
+    motivo = motivo.mask(rows['version_name'].fillna('') == '', "nombre vacío")
+
+    valid = motivo == ''
+    rejected = frame.loc[~valid].assign(motivo=motivo[~valid])
+    rows = rows.loc[valid].astype({'total_unidades': 'int64'})
+    return rows, rejected
+
+
+def import_versions(source, fmt=None, chunk_size=IMPORT_CHUNK_SIZE):
+    """Bulk-insert versions from a CSV or Parquet file in a single transaction.
+
+    ``source`` is a path or a file-like object; the format is taken from its
+    name unless ``fmt`` ('csv' or 'parquet') is given. The file is read and
+    validated chunk by chunk on the calling thread, so the writer only spends
+    the executemany of the valid rows in its transaction, and other sessions'
+    writes queued behind it aren't held up by parsing. Either all valid rows
+    are committed or none are. Returns ``(imported, rejected)``, the number of
+    rows inserted and a DataFrame of the rejected rows with their reason.
+    """
+    import pandas as pd
+
+    from calculator import INPUT_FIELDS
+
+    given = ('version_name', 'created_date') + INPUT_FIELDS
+    columns = given + STORED_METRICS
+    sql = (
+        f"INSERT INTO calculation_versions ({', '.join(columns)}) "
+        f"VALUES ({', '.join('?' * len(columns))})"
+    )
+
+    valid = []
+    rejected = []
+    for chunk in read_chunks(source, fmt, chunk_size):
+        rows, bad = validate_versions(chunk)
+        metrics = derived_metrics({field: rows[field].to_numpy(dtype=float) for field in INPUT_FIELDS})
+        valid.append((rows, metrics))
+        if not bad.empty:
+            rejected.append(bad)
+    imported = sum(len(rows) for rows, _ in valid)
+    result = (imported, pd.concat(rejected) if rejected else pd.DataFrame())
+    if not imported:
+        return result
+
+    def write(conn):
+        for rows, metrics in valid:
+            # Series.tolist() yields plain Python scalars, which sqlite3 can bind
+            conn.executemany(sql, zip(*(rows[column].tolist() for column in given),
+                                      *(metrics[name] for name in STORED_METRICS)))
+        return result, [('reset', None)]
+    return _get_writer().submit(write).result()
+
+
+def _arrow_schema(conn):
+    import pyarrow as pa
+
+    types = {'INTEGER': pa.int64(), 'REAL': pa.float64(), 'TEXT': pa.string()}
+    return pa.schema([
+        (row[1], types.get(row[2].upper(), pa.string()))
+        for row in conn.execute('PRAGMA table_info(calculation_versions)')
+    ])
+
+
+def export_versions(destination, fmt=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Stream every version to a CSV or Parquet file, oldest first.
+
+    Rows are fetched ``chunk_size`` at a time and written as they arrive, so
+    memory use doesn't depend on the size of the history. The export reads
+    through its own connection; under WAL it sees a consistent snapshot and
+    doesn't block the app's writes. Returns the number of rows written.
+    """
+    fmt = file_format(destination, fmt)
+    conn = _open_side_connection()
+    written = 0
+    try:
+        cursor = conn.execute('SELECT * FROM calculation_versions ORDER BY created_date, id')
+        header = [column[0] for column in cursor.description]
+        if fmt == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            schema = _arrow_schema(conn)
+            with pq.ParquetWriter(destination, schema) as writer:
+                while rows := cursor.fetchmany(chunk_size):
+                    columns = list(zip(*rows))
+                    writer.write_table(pa.table(
+                        {name: pa.array(columns[i], type=schema.field(name).type) for i, name in enumerate(header)},
+                        schema=schema,
+                    ))
+                    written += len(rows)
+        else:
+            handle = open(destination, 'w', newline='', encoding='utf-8') if isinstance(destination, str) else destination
+            try:
+                writer = csv.writer(handle)
+                writer.writerow(header)
+                while rows := cursor.fetchmany(chunk_size):
+                    writer.writerows(rows)
+                    written += len(rows)
+            finally:
+                if isinstance(destination, str):
+                    handle.close()
+    finally:
+        conn.close()
+    return written
@@ -0,0 +1,171 @@
+"""Next-month forecast of every calculator input from the saved versions.
+
+Each input gets a linear trend in time (months), fitted by exponentially
+weighted least squares: a version's weight halves every HALF_LIFE_MONTHS
+before the newest one. The fit only needs seven decayed sums per input,
+kept for all 15 inputs at once in NumPy vectors. A save adds its row to the
+sums in O(1) through the database listener hook, whatever its date. Deletes,
+bulk imports and database changes refit from scratch on next use, as in
+history.py, reading the inputs straight into NumPy without pandas.
+Forecasts come with a prediction band from the weighted residual variance.
+"""
+import threading
+from statistics import NormalDist
+
+import numpy as np
+
+import database
+from calculator import INPUT_FIELDS
+
+HALF_LIFE_MONTHS = 6.0
+DAYS_PER_MONTH = 30.4375
+
+# Inputs that are whole numbers
+INTEGER_FIELDS = ('total_unidades',)
+
+# Order of the decayed sums: weights, squared weights, t, t², y, t·y, y²
+_W, _W2, _T, _TT, _Y, _TY, _YY = range(7)
+
+
+def _months(dates):
+    return np.asarray(dates, dtype='datetime64[s]').astype(np.float64) / 86_400 / DAYS_PER_MONTH
+
+
+class InputForecast:
+    """Decayed regression sums of every input over the saved versions."""
+
+    def __init__(self, half_life=HALF_LIFE_MONTHS):
+        self.decay = 0.5 ** (1 / half_life)
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._sums = None
+        self._origin = 0.0
+        self._newest = None
+        self._last = None
+        self._count = 0
+        # Highest id read by the last load; its save events are already summed
+        self._loaded_id = 0
+
+    # ----------------- LOADING -----------------
+    def _load(self):
+        ids, dates, y = database.get_version_input_arrays()
+        self._sums = np.zeros((7, len(INPUT_FIELDS)))
+        self._newest = None
+        self._last = None
+        self._count = len(dates)
+        self._loaded_id = int(ids.max()) if self._count else 0
+        if self._count:
+            # Rows come oldest first; times are kept relative to the oldest, for precision
+            t = _months(dates)
+            self._origin = t[0]
+            t = t - self._origin
+            y = np.nan_to_num(y)
+            self._newest = t[-1]
+            self._last = y[-1]
+            self._add(t[:, np.newaxis], y)
+        self._loaded = True
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self._load()
+
+    # ----------------- INCREMENTAL UPDATES -----------------
+    def _add(self, t, y):
+        # ``t`` and ``y`` hold one row per version; weights are relative to the newest
+        w = self.decay ** (self._newest - t) * np.ones_like(y)
+        self._sums += np.stack([w, w * w, w * t, w * t * t, w * y, w * t * y, w * y * y]).sum(axis=1)
+
+    def _append(self, row):
+        t = _months(row['created_date']) - self._origin
+        y = np.array([float(row[field] or 0) for field in INPUT_FIELDS])
+        if self._newest is None:
+            self._origin, t = t, 0.0
+            self._newest, self._last = t, y
+        elif t >= self._newest:
+            if t > self._newest:
+                # Age everything already summed by the time since the newest version
+                step = self.decay ** (t - self._newest)
+                self._sums *= np.array([step, step * step, step, step, step, step, step])[:, np.newaxis]
+            # Saves within the same second as the newest are newer by id
+            self._newest, self._last = t, y
+        self._add(np.array([[t]]), y[np.newaxis])
+        self._count += 1
+
+    def on_change(self, event, payload):
+        """database listener keeping the sums in sync with each write."""
+        with self._lock:
+            if not self._loaded:
+                return
+            if event == 'save':
+                # A load between the commit and this event already summed the row
+                if payload['id'] > self._loaded_id:
+                    self._append(payload)
+            else:
+                self._loaded = False
+
+    # ----------------- QUERIES -----------------
+    def __len__(self):
+        with self._lock:
+            self._ensure_loaded()
+            return self._count
+
+    def predict(self, months_ahead=1.0, confidence=0.95):
+        """Forecast of every input ``months_ahead`` after the newest version.
+
+        Returns ``{field: (ultimo, pronostico, bajo, alto)}``. ``bajo`` and
+        ``alto`` bound the ``confidence`` prediction band and are None until
+        there is enough history (effective sample size above 2). Values are
+        clipped at 0, whole-number inputs are rounded and at least 1. Returns
+        an empty dict when there are no versions.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            if self._newest is None:
+                return {}
+            s = self._sums.copy()
+            target = self._newest + months_ahead
+            last = self._last
+
+        w = s[_W]
+        mean_t, mean_y = s[_T] / w, s[_Y] / w
+        var_t = np.maximum(s[_TT] / w - mean_t ** 2, 0.0)
+        cov_ty = s[_TY] / w - mean_t * mean_y
+        var_y = np.maximum(s[_YY] / w - mean_y ** 2, 0.0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # A single date gives no trend; forecast the weighted mean
+            slope = np.where(var_t > 1e-9, cov_ty / var_t, 0.0)
+            pronostico = mean_y + slope * (target - mean_t)
+            n_eff = w ** 2 / s[_W2]
+            residual = np.maximum(var_y - slope * cov_ty, 0.0) * n_eff / (n_eff - 2)
+            leverage = np.where(var_t > 1e-9, (target - mean_t) ** 2 / (n_eff * var_t), 0.0)
+            spread = np.sqrt(residual * (1 + 1 / n_eff + leverage))
+        z = NormalDist().inv_cdf((1 + confidence) / 2)
+        banded = n_eff > 2
+
+        result = {}
+        for i, field in enumerate(INPUT_FIELDS):
+            low = high = None
+            if banded[i]:
+                low = round(max(float(pronostico[i] - z * spread[i]), 0.0), 2)
+                high = round(max(float(pronostico[i] + z * spread[i]), 0.0), 2)
+            value = max(pronostico[i], 0.0)
+            if field in INTEGER_FIELDS:
+                value = max(int(round(value)), 1)
+                if low is not None:
+                    low, high = max(int(np.floor(low)), 1), max(int(np.ceil(high)), 1)
+            result[field] = (float(last[i]), value if field in INTEGER_FIELDS else round(float(value), 2), low, high)
+        return result
+
+
+_forecast = None
+_forecast_lock = threading.Lock()
+
+
+def get_forecast():
+    """Return the process-wide InputForecast, registering it with database."""
+    global _forecast
+    with _forecast_lock:
+        if _forecast is None:
+            _forecast = InputForecast()
+            database.add_listener(_forecast.on_change)
+        return _forecast
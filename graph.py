@@ -0,0 +1,152 @@
+"""Dependency graph of the calculator page's formulas and charts.
+
+Every formula and chart is a node that declares the named values it reads,
+which are either inputs (the 15 calculator fields) or other nodes. An
+Evaluation holds one session's values. Nodes are computed lazily when
+read, and recomputed only when the version of one of their dependencies
+has moved since the last time. A version moves only when a value actually
+changes, so a new precio_venta_sugerido redraws the suggested pie and the
+stacked bar but serves "Costos por Rubro" and the "Actual" pie from memory.
+"""
+from calculator import COST_FIELDS, INPUT_FIELDS, InputRecord, margin_for_price, record_metrics
+
+
+class Graph:
+    """Registry of nodes: name -> (function, dependency names)."""
+
+    def __init__(self):
+        self._nodes = {}
+
+    def node(self, name, *deps):
+        """Decorator registering ``fn(*dep_values)`` as node ``name``."""
+        def register(fn):
+            self._nodes[name] = (fn, deps)
+            return fn
+        return register
+
+    def evaluation(self):
+        """A fresh, empty evaluation state for one session."""
+        return Evaluation(self)
+
+
+def _changed(old, new):
+    try:
+        return bool(old != new)
+    except (TypeError, ValueError):
+        # e.g. arrays, whose comparison has no single truth value
+        return True
+
+
+class Evaluation:
+    """Input values, memoized node values and their versions for one session."""
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.recomputed = []
+        self._values = {}
+        self._versions = {}
+        self._stamps = {}
+
+    def _store(self, name, value):
+        if name not in self._values or _changed(self._values[name], value):
+            self._values[name] = value
+            self._versions[name] = self._versions.get(name, 0) + 1
+
+    def start_run(self):
+        """Forget which nodes were recomputed during the previous run."""
+        self.recomputed = []
+
+    def set(self, name, value):
+        """Set an input; dependents are invalidated only if the value changed."""
+        self._store(name, value)
+
+    def update(self, values):
+        """Set several inputs at once."""
+        for name, value in values.items():
+            self._store(name, value)
+
+    def get(self, name):
+        """Value of an input or node, recomputing the node only if stale."""
+        if name not in self.graph._nodes:
+            return self._values[name]
+        fn, deps = self.graph._nodes[name]
+        args = [self.get(dep) for dep in deps]
+        stamp = tuple(self._versions[dep] for dep in deps)
+        if self._stamps.get(name) != stamp:
+            self._store(name, fn(*args))
+            self._stamps[name] = stamp
+            self.recomputed.append(name)
+        return self._values[name]
+
+
+# ----------------- CALCULATOR PAGE -----------------
+CALCULATOR = Graph()
+
+
+# Every formula is evaluated once, by record_metrics(), whose cache is shared
+# with the other sessions. The nodes below split its result so a change that
+# leaves a group's values equal doesn't move that group's version.
+@CALCULATOR.node('metricas', *INPUT_FIELDS)
+def _metricas(*values):
+    return record_metrics(InputRecord(*values))
+
+
+def _subset(metricas, names):
+    return {name: metricas[name] for name in names}
+
+
+@CALCULATOR.node('costos', 'metricas')
+def _costos(metricas):
+    return _subset(metricas, ('empaques', 'costo_total', 'costo_por_bolsa'))
+
+
+@CALCULATOR.node('actual', 'metricas')
+def _actual(metricas):
+    return _subset(metricas, ('utilidad_por_bolsa', 'utilidad_total', 'utilidad_pct'))
+
+
+@CALCULATOR.node('sugerido', 'metricas')
+def _sugerido(metricas):
+    return _subset(metricas, ('utilidad_por_bolsa_sug', 'utilidad_total_sug', 'utilidad_pct_sug'))
+
+
+@CALCULATOR.node('margen_actual', 'precio_venta', 'costos')
+def _margen_actual(precio, costos):
+    return float(margin_for_price(precio, costos['costo_por_bolsa']))
+
+
+@CALCULATOR.node('margen_sugerido', 'precio_venta_sugerido', 'costos')
+def _margen_sugerido(precio, costos):
+    return float(margin_for_price(precio, costos['costo_por_bolsa']))
+
+
+# Charts import matplotlib only when first drawn
+@CALCULATOR.node('grafico.costos_por_rubro', *COST_FIELDS, 'costos')
+def _grafico_costos_por_rubro(*values):
+    import charts
+
+    *costs, costos = values
+    return charts.cost_breakdown_chart(tuple(float(value) for value in costs) + (costos['empaques'],))
+
+
+@CALCULATOR.node('grafico.composicion_actual', 'costos', 'actual')
+def _grafico_composicion_actual(costos, actual):
+    import charts
+
+    return charts.price_composition_chart(costos['costo_por_bolsa'], actual['utilidad_por_bolsa'], "Actual")
+
+
+@CALCULATOR.node('grafico.composicion_sugerido', 'costos', 'sugerido')
+def _grafico_composicion_sugerido(costos, sugerido):
+    import charts
+
+    return charts.price_composition_chart(costos['costo_por_bolsa'], sugerido['utilidad_por_bolsa_sug'], "Sugerido")
+
+
+@CALCULATOR.node('grafico.costo_utilidad', 'costos', 'actual', 'sugerido')
+def _grafico_costo_utilidad(costos, actual, sugerido):
+    import charts
+
+    return charts.cost_profit_chart(
+        costos['costo_por_bolsa'], actual['utilidad_por_bolsa'], sugerido['utilidad_por_bolsa_sug']
+    )
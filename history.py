@@ -0,0 +1,164 @@
+"""Columnar in-memory copy of calculation_versions for trend analytics.
+
+The table is read from SQLite once per process into NumPy column buffers,
+sorted by creation date, and the derived metrics are computed for all rows
+in one vectorized pass. Afterwards the store follows the database through
+its listener hook: a save appends one row and computes only that row's
+metrics, and a delete compresses the buffers. Bulk imports and database
+changes trigger a full reload on next use.
+"""
+import threading
+
+import numpy as np
+
+import database
+from calculator import INPUT_FIELDS, compute_metrics
+
+# Derived columns kept next to the inputs
+METRIC_COLUMNS = ('costo_total', 'costo_por_bolsa', 'utilidad_total', 'utilidad_pct', 'utilidad_pct_sug')
+
+_INITIAL_CAPACITY = 256
+
+
+class VersionHistory:
+    """Growable column buffers holding every saved version and its metrics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._size = 0
+        # Highest id read by the last load; its save events are already in
+        self._loaded_id = 0
+        self._ids = None
+        self._names = None
+        self._dates = None
+        self._columns = None
+
+    # ----------------- LOADING -----------------
+    def _load(self):
+        frame = database.get_all_version_inputs().sort_values(['created_date', 'id'])
+        size = len(frame)
+        capacity = max(_INITIAL_CAPACITY, 2 * size)
+        self._ids = np.empty(capacity, dtype=np.int64)
+        self._names = np.empty(capacity, dtype=object)
+        self._dates = np.empty(capacity, dtype='datetime64[s]')
+        self._columns = {name: np.empty(capacity) for name in INPUT_FIELDS + METRIC_COLUMNS}
+
+        self._ids[:size] = frame['id'].to_numpy()
+        self._names[:size] = frame['version_name'].to_numpy()
+        self._dates[:size] = frame['created_date'].to_numpy(dtype='datetime64[s]')
+        inputs = {field: frame[field].fillna(0).to_numpy(dtype=float) for field in INPUT_FIELDS}
+        metrics = compute_metrics(inputs)
+        for field, values in inputs.items():
+            self._columns[field][:size] = values
+        for name in METRIC_COLUMNS:
+            self._columns[name][:size] = metrics[name]
+        self._size = size
+        self._loaded_id = int(self._ids[:size].max()) if size else 0
+        self._loaded = True
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self._load()
+
+    # ----------------- INCREMENTAL UPDATES -----------------
+    def _grow(self):
+        capacity = 2 * len(self._ids)
+        self._ids = np.resize(self._ids, capacity)
+        self._names = np.resize(self._names, capacity)
+        self._dates = np.resize(self._dates, capacity)
+        self._columns = {name: np.resize(values, capacity) for name, values in self._columns.items()}
+
+    def _append(self, row):
+        if self._size == len(self._ids):
+            self._grow()
+        date = np.datetime64(row['created_date'].replace(' ', 'T'), 's')
+        if self._size and date < self._dates[self._size - 1]:
+            # Out-of-order rows are rare enough that a full reload is fine
+            self._loaded = False
+            return
+        inputs = {field: float(row[field] or 0) for field in INPUT_FIELDS}
+        metrics = compute_metrics(inputs)
+        i = self._size
+        self._ids[i] = row['id']
+        self._names[i] = row['version_name']
+        self._dates[i] = date
+        for field, value in inputs.items():
+            self._columns[field][i] = value
+        for name in METRIC_COLUMNS:
+            self._columns[name][i] = metrics[name]
+        self._size += 1
+
+    def _remove(self, ids):
+        keep = ~np.isin(self._ids[:self._size], ids)
+        size = int(keep.sum())
+        self._ids[:size] = self._ids[:self._size][keep]
+        self._names[:size] = self._names[:self._size][keep]
+        self._dates[:size] = self._dates[:self._size][keep]
+        for values in self._columns.values():
+            values[:size] = values[:self._size][keep]
+        self._size = size
+
+    def on_change(self, event, payload):
+        """database listener keeping the buffers in sync with each write."""
+        with self._lock:
+            if not self._loaded:
+                return
+            if event == 'save':
+                # A load between the commit and this event already read the row
+                if payload['id'] > self._loaded_id:
+                    self._append(payload)
+            elif event == 'delete':
+                self._remove(payload)
+            else:
+                self._loaded = False
+
+    # ----------------- QUERIES -----------------
+    def __len__(self):
+        with self._lock:
+            self._ensure_loaded()
+            return self._size
+
+    def frame(self):
+        """All versions with their metrics and meat share, oldest first."""
+        import pandas as pd
+
+        with self._lock:
+            self._ensure_loaded()
+            size = self._size
+            columns = {name: values[:size].copy() for name, values in self._columns.items()}
+            frame = pd.DataFrame({
+                'id': self._ids[:size].copy(),
+                'version_name': self._names[:size].copy(),
+                'created_date': self._dates[:size].copy(),
+                **columns,
+            })
+        with np.errstate(divide='ignore', invalid='ignore'):
+            frame['participacion_carne'] = frame['carne_fresca'] / frame['costo_total'] * 100
+        return frame
+
+    def monthly(self):
+        """Monthly means of the trend metrics with month-over-month deltas."""
+        frame = self.frame()
+        trends = ['costo_por_bolsa', 'participacion_carne', 'utilidad_pct', 'utilidad_pct_sug', 'costo_total', 'utilidad_total']
+        monthly = frame.groupby(frame['created_date'].dt.to_period('M'))[trends].mean()
+        monthly['versiones'] = frame.groupby(frame['created_date'].dt.to_period('M')).size()
+        for name in ('costo_por_bolsa', 'participacion_carne', 'utilidad_pct'):
+            monthly[f'{name}_delta'] = monthly[name].diff()
+        monthly['costo_por_bolsa_delta_pct'] = monthly['costo_por_bolsa'].pct_change() * 100
+        monthly.index = monthly.index.to_timestamp()
+        return monthly
+
+
+_history = None
+_history_lock = threading.Lock()
+
+
+def get_history():
+    """Return the process-wide VersionHistory, registering it with database."""
+    global _history
+    with _history_lock:
+        if _history is None:
+            _history = VersionHistory()
+            database.add_listener(_history.on_change)
+        return _history
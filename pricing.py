@@ -0,0 +1,80 @@
+"""Profit-maximizing price search under a demand curve.
+
+Demand is modeled with constant elasticity, ``q = q_ref × (p / p_ref)^(-e)``.
+It is either given directly (elasticity plus a reference point) or fitted
+by least squares in log-log space to observed price/volume pairs. The search
+evaluates every candidate price in one vectorized pass. Each candidate's
+volume feeds back into empaques and costo_por_bolsa, and optionally into the
+cost items that scale with production.
+"""
+import numpy as np
+
+from calculator import compute_costs, price_metrics
+
+DEFAULT_CANDIDATES = 5_000
+
+# Cost items that grow with the number of bags produced
+VARIABLE_COST_FIELDS = ('carne_fresca', 'sal', 'corte_carne')
+
+
+def demand(precios, elasticidad, precio_ref, unidades_ref):
+    """Bags sold at each price under constant elasticity."""
+    precios = np.asarray(precios, dtype=np.float64)
+    return unidades_ref * (precios / precio_ref) ** (-elasticidad)
+
+
+def fit_demand(precios, unidades):
+    """Fit a constant-elasticity curve to observed (price, volume) pairs.
+
+    Returns ``(elasticidad, precio_ref, unidades_ref)`` with the reference
+    price at the geometric mean of the observations. Raises ValueError with
+    fewer than two distinct positive prices.
+    """
+    precios = np.asarray(precios, dtype=np.float64)
+    unidades = np.asarray(unidades, dtype=np.float64)
+    valid = (precios > 0) & (unidades > 0)
+    precios, unidades = precios[valid], unidades[valid]
+    if np.unique(precios).size < 2:
+        raise ValueError("Se necesitan al menos dos precios distintos con volumen positivo")
+    pendiente, intercepto = np.polyfit(np.log(precios), np.log(unidades), 1)
+    log_ref = np.log(precios).mean()
+    return float(-pendiente), float(np.exp(log_ref)), float(np.exp(intercepto + pendiente * log_ref))
+
+
+def optimize_price(inputs, precios, elasticidad, precio_ref, unidades_ref, variable_fields=VARIABLE_COST_FIELDS):
+    """Find the candidate price with the highest utilidad_total.
+
+    ``inputs`` are the calculator inputs at the reference volume
+    ``inputs['total_unidades']``. The items in ``variable_fields`` are scaled
+    by each candidate's volume over that reference; all other costs stay
+    fixed. Returns the full curves (``precios``, ``unidades``,
+    ``costo_por_bolsa``, ``utilidad_total``, ``utilidad_pct``) and the
+    ``optimo`` dict of values at the best price.
+    """
+    precios = np.asarray(precios, dtype=np.float64)
+    unidades = np.maximum(np.rint(demand(precios, elasticidad, precio_ref, unidades_ref)), 1)
+
+    scenario = dict(inputs)
+    scenario['total_unidades'] = unidades
+    escala = unidades / max(float(inputs['total_unidades']), 1)
+    for field in variable_fields:
+        scenario[field] = float(inputs[field]) * escala
+
+    costs = compute_costs(scenario)
+    _, utilidad_total, utilidad_pct = price_metrics(precios, costs['costo_por_bolsa'], unidades)
+    best = int(np.nanargmax(utilidad_total))
+    return {
+        'precios': precios,
+        'unidades': unidades,
+        'costo_por_bolsa': costs['costo_por_bolsa'],
+        'utilidad_total': utilidad_total,
+        'utilidad_pct': utilidad_pct,
+        'optimo': {
+            'precio': float(precios[best]),
+            'unidades': float(unidades[best]),
+            'costo_por_bolsa': float(costs['costo_por_bolsa'][best]),
+            'utilidad_total': float(utilidad_total[best]),
+            'utilidad_pct': float(utilidad_pct[best]),
+            'en_borde': best in (0, len(precios) - 1),
+        },
+    }
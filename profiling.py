@@ -0,0 +1,85 @@
+"""Opt-in per-rerun timing of the app's logical sections.
+
+Set VAQUITA_PROFILE=1 to enable it. Each rerun then times its sections
+(database init, session-state hydration, calculations, each chart, the
+versions list...). It records wall time, the net change in traced Python
+memory and the process RSS. Sections show in a collapsible sidebar panel
+and are logged as one JSON object per line on the ``vaquita.profile``
+logger. When disabled, section() returns a shared no-op context manager.
+"""
+import json
+import logging
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+ENABLED = os.environ.get('VAQUITA_PROFILE') == '1'
+
+logger = logging.getLogger('vaquita.profile')
+
+_NOOP = nullcontext()
+
+
+def rss_kb():
+    """Resident set size of this process in KiB, or None off Linux."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class RerunProfile:
+    """Timings of the sections of one script run."""
+
+    def __init__(self, session=None):
+        self.session = session
+        self.sections = []
+        self._start = time.perf_counter()
+
+    def section(self, name):
+        """Context manager timing the enclosed block as section ``name``."""
+        if not ENABLED:
+            return _NOOP
+        return self._timed(name)
+
+    @contextmanager
+    def _timed(self, name):
+        memory = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.sections.append({
+                'section': name,
+                'ms': round((time.perf_counter() - start) * 1000, 3),
+                'mem_delta_kb': round((tracemalloc.get_traced_memory()[0] - memory) / 1024, 1),
+                'rss_kb': rss_kb(),
+            })
+
+    def finish(self, page):
+        """Log every section plus the rerun total; returns the total in ms."""
+        total = round((time.perf_counter() - self._start) * 1000, 3)
+        if ENABLED:
+            for entry in self.sections:
+                logger.info(json.dumps({'event': 'section', 'session': self.session, 'page': page, **entry}))
+            logger.info(json.dumps({
+                'event': 'rerun', 'session': self.session, 'page': page, 'ms': total, 'rss_kb': rss_kb(),
+            }))
+        return total
+
+
+def start_rerun(session=None):
+    """Begin profiling a script run; ``session`` tags its log lines."""
+    return RerunProfile(session)
+
+
+if ENABLED:
+    tracemalloc.start()
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
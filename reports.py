@@ -0,0 +1,178 @@
+"""Batch PDF and Excel reports of saved versions.
+
+Each version becomes one A4 PDF page: the metrics block of the calculator
+page, "Costos por Rubro", both composition pies and the cost + profit bars.
+Every page is drawn and saved as a one-page vector PDF on a process pool,
+with at most two pages per worker in flight, and the parent only appends
+the finished pages to the report in order with pypdf. The appended pages,
+about 40 KB each, are held until the report is written, when the glyphs
+they share are stored once. Text stays searchable. The Excel workbook is written in openpyxl's write-only mode, one row per
+version with its inputs and every metric, and streams to disk.
+
+The app runs this module as a script (see main()), so the spawned workers
+start from it and not from the Streamlit script.
+"""
+import argparse
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+
+from calculator import COST_FIELDS, COSTO_UNITARIO_EMPAQUE, INPUT_FIELDS, METRIC_FIELDS, compute_metrics, to_scalars
+
+PAGE_SIZE = (8.27, 11.69)  # A4 portrait, inches
+
+
+def _metrics(row):
+    return to_scalars(compute_metrics({field: row[field] or 0 for field in INPUT_FIELDS}))
+
+
+def _metrics_lines(row, m):
+    return [
+        ("Costo total del mes", f"${m['costo_total']:,.2f}"),
+        ("Costo/bolsa", f"${m['costo_por_bolsa']:,.2f}"),
+        ("Bolsas producidas", f"{row['total_unidades']:,.0f}"),
+        ("Costo total empaques", f"${m['empaques']:,.2f} (${COSTO_UNITARIO_EMPAQUE:.2f}/bolsa)"),
+        ("Precio actual", f"${row['precio_venta']:,.2f}"),
+        ("  Utilidad/bolsa · total · margen",
+         f"${m['utilidad_por_bolsa']:,.2f} · ${m['utilidad_total']:,.2f} · {m['utilidad_pct']:.1f}%"),
+        ("Precio sugerido", f"${row['precio_venta_sugerido']:,.2f}"),
+        ("  Utilidad/bolsa · total · margen",
+         f"${m['utilidad_por_bolsa_sug']:,.2f} · ${m['utilidad_total_sug']:,.2f} · {m['utilidad_pct_sug']:.1f}%"),
+    ]
+
+
+def render_page(row):
+    """Report page of one version as the bytes of a one-page PDF.
+
+    Runs in a worker process.
+    """
+    import charts
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    m = _metrics(row)
+    fig = Figure(figsize=PAGE_SIZE)
+    FigureCanvasAgg(fig)
+    grid = fig.add_gridspec(4, 2, height_ratios=[1.1, 1.6, 1.3, 1.0], hspace=0.45, wspace=0.3,
+                            left=0.17, right=0.95, top=0.92, bottom=0.05)
+    titulo = row['version_name'] if not row.get('sucursal') else f"{row['version_name']} — {row['sucursal']}"
+    fig.suptitle(f"La Vaquita Feliz — {titulo}".replace('$', r'\$'), fontsize=13, fontweight='bold')
+    fig.text(0.5, 0.935, f"Creado: {row['created_date']}", ha='center', fontsize=9, color='gray')
+
+    bloque = fig.add_subplot(grid[0, :])
+    bloque.axis('off')
+    for i, (etiqueta, valor) in enumerate(_metrics_lines(row, m)):
+        y = 1 - i / 8
+        bloque.text(-0.1, y, etiqueta, fontsize=9, va='top', transform=bloque.transAxes)
+        # Escape the dollar signs, or matplotlib reads "$...$" as math text
+        bloque.text(0.55, y, valor.replace('$', r'\$'), fontsize=9, va='top', fontweight='bold', transform=bloque.transAxes)
+
+    values = tuple(float(row[field] or 0) for field in COST_FIELDS) + (m['empaques'],)
+    charts.draw_cost_breakdown(fig.add_subplot(grid[1, :]), values)
+    charts.draw_price_composition(fig.add_subplot(grid[2, 0]), m['costo_por_bolsa'], m['utilidad_por_bolsa'], "Actual")
+    charts.draw_price_composition(fig.add_subplot(grid[2, 1]), m['costo_por_bolsa'], m['utilidad_por_bolsa_sug'], "Sugerido")
+    charts.draw_cost_profit(fig.add_subplot(grid[3, :]), m['costo_por_bolsa'], m['utilidad_por_bolsa'], m['utilidad_por_bolsa_sug'])
+    pagina = io.BytesIO()
+    try:
+        fig.savefig(pagina, format='pdf')
+    finally:
+        fig.clear()
+    return pagina.getvalue()
+
+
+class _XlsxWriter:
+    """Stream one row per version into a write-only workbook."""
+
+    def __init__(self, destination, sucursal):
+        from openpyxl import Workbook
+
+        self.destination = destination
+        self._workbook = Workbook(write_only=True)
+        self._sheet = self._workbook.create_sheet("Versiones")
+        self._sucursal = sucursal
+        self._columns = (('sucursal',) if sucursal else ()) + ('id', 'version_name', 'created_date') + INPUT_FIELDS
+        self._sheet.append(list(self._columns + METRIC_FIELDS))
+
+    def write(self, row):
+        m = _metrics(row)
+        self._sheet.append([row.get(column) for column in self._columns] + [m[name] for name in METRIC_FIELDS])
+
+    def close(self):
+        self._workbook.save(self.destination)
+
+
+def build_reports(rows, pdf_path=None, xlsx_path=None, workers=None, sucursal=False):
+    """Write the PDF and/or Excel report of ``rows``; returns how many versions.
+
+    ``rows`` is an iterable of version dicts such as database.iter_versions()
+    yields, optionally with a ``sucursal`` key (set ``sucursal=True`` to get
+    that column in the workbook). ``workers`` processes render the PDF pages;
+    1 renders them in this process. Workers are spawned, not forked, so they
+    don't inherit the caller's threads or open connections; the caller's
+    ``__main__`` must be import-safe, as cli.py and this module are.
+    """
+    workers = workers or os.cpu_count() or 1
+    xlsx = _XlsxWriter(xlsx_path, sucursal) if xlsx_path else None
+    count = 0
+    with ExitStack() as stack:
+        pdf = pool = None
+        if pdf_path:
+            from pypdf import PdfReader, PdfWriter
+
+            pdf = PdfWriter()
+            if workers > 1:
+                pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+                stack.callback(pool.shutdown, cancel_futures=True)
+        if xlsx:
+            stack.callback(xlsx.close)
+
+        def append(pagina):
+            pdf.append(PdfReader(io.BytesIO(pagina)))
+
+        pending = []
+        for row in rows:
+            count += 1
+            if xlsx:
+                xlsx.write(row)
+            if pdf is None:
+                continue
+            if pool is None:
+                append(render_page(row))
+                continue
+            pending.append(pool.submit(render_page, row))
+            # Keep at most 2 pages per worker in flight
+            if len(pending) >= 2 * workers:
+                append(pending.pop(0).result())
+        for future in pending:
+            append(future.result())
+        if pdf is not None:
+            # Every page embeds its own copy of the glyphs; keep one of each
+            pdf.compress_identical_objects(remove_duplicates=True, remove_unreferenced=True)
+            pdf.write(pdf_path)
+    return count
+
+
+def main(argv=None):
+    """Report of some versions of one database, run by the app as a script.
+
+    Starting the pool from here keeps app.py out of the spawned workers,
+    which would otherwise import it as their ``__main__``.
+    """
+    parser = argparse.ArgumentParser(description="Reporte PDF y/o Excel de versiones guardadas.")
+    parser.add_argument('ids', type=int, nargs='+', help="ids de las versiones")
+    parser.add_argument('--db', required=True, help="base de datos")
+    parser.add_argument('--pdf', help="archivo PDF, una página por versión")
+    parser.add_argument('--xlsx', help="libro de Excel, una fila por versión")
+    parser.add_argument('--workers', type=int, help="procesos en paralelo (1 = sin pool)")
+    args = parser.parse_args(argv)
+
+    import database
+
+    database.configure(args.db)
+    build_reports(database.iter_versions(args.ids), args.pdf, args.xlsx, workers=args.workers)
+
+
+if __name__ == '__main__':
+    main()
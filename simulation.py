@@ -0,0 +1,141 @@
+"""Monte Carlo risk simulation on top of the vectorized cost model.
+
+Uncertain inputs are described with small hashable tuples built by normal()
+and triangular(), so a simulation request can be used directly as a cache key.
+Samples are drawn and evaluated in fixed-size chunks, and each chunk is
+discarded once it has been added to fixed-size histograms of the two output
+metrics, so memory doesn't grow with the number of samples. A first pass
+finds each metric's range. A second pass regenerates the same chunks from
+their seeds and fills the histograms. Percentiles are interpolated within
+QUANTILE_BINS bins, which keeps them within a small fraction of the range.
+"""
+import numpy as np
+
+from calculator import compute_costs, price_metrics
+
+DEFAULT_CHUNK_SIZE = 50_000
+PERCENTILES = (5, 50, 95)
+HISTOGRAM_BINS = 60
+# Bins of the histograms the percentiles are read from
+QUANTILE_BINS = 1 << 16
+
+
+def normal(mean, std):
+    """Normal distribution with the given mean and standard deviation."""
+    return ('normal', float(mean), float(std))
+
+
+def triangular(low, mode, high):
+    """Triangular distribution over [low, high] peaking at ``mode``."""
+    return ('triangular', float(low), float(mode), float(high))
+
+
+def validate(distribution):
+    """Raise ValueError if a distribution's parameters are inconsistent."""
+    kind = distribution[0]
+    if kind == 'normal':
+        if distribution[2] < 0:
+            raise ValueError("La desviación estándar no puede ser negativa")
+    elif kind == 'triangular':
+        low, mode, high = distribution[1:]
+        if not low <= mode <= high:
+            raise ValueError("Se requiere mínimo ≤ moda ≤ máximo")
+    else:
+        raise ValueError(f"Distribución desconocida: {kind}")
+
+
+def _draw(rng, distribution, size):
+    kind = distribution[0]
+    if kind == 'normal':
+        return rng.normal(distribution[1], distribution[2], size)
+    low, mode, high = distribution[1:]
+    if low == high:
+        return np.full(size, low)
+    return rng.triangular(low, mode, high, size)
+
+
+def _sample_chunk(rng, base_inputs, distributions, size):
+    chunk = dict(base_inputs)
+    for field, distribution in distributions:
+        values = _draw(rng, distribution, size)
+        if field == 'total_unidades':
+            values = np.maximum(np.rint(values), 1)
+        else:
+            values = np.maximum(values, 0)
+        chunk[field] = values
+    return chunk
+
+
+def _evaluate_chunk(seed, base_inputs, distributions, size):
+    chunk = _sample_chunk(np.random.default_rng(seed), base_inputs, distributions, size)
+    costs = compute_costs(chunk)
+    _, utilidad_total, _ = price_metrics(chunk['precio_venta'], costs['costo_por_bolsa'], chunk['total_unidades'])
+    # Inputs that don't vary leave scalar metrics
+    return np.broadcast_to(utilidad_total, (size,)), np.broadcast_to(costs['costo_por_bolsa'], (size,))
+
+
+def _percentiles(counts, edges, low, high):
+    # Interpolate each percentile linearly within the bin that holds it
+    if low == high:
+        return {p: float(low) for p in PERCENTILES}
+    cumulative = np.cumsum(counts)
+    result = {}
+    for p in PERCENTILES:
+        rank = p / 100 * cumulative[-1]
+        i = min(int(np.searchsorted(cumulative, rank)), len(counts) - 1)
+        before = cumulative[i] - counts[i]
+        fraction = (rank - before) / counts[i] if counts[i] else 0.0
+        result[p] = float(min(max(edges[i] + fraction * (edges[i + 1] - edges[i]), low), high))
+    return result
+
+
+def simulate(base_inputs, distributions, n_samples=100_000, seed=0, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Simulate utilidad_total and costo_por_bolsa under input uncertainty.
+
+    ``base_inputs`` maps every input field to its current value and
+    ``distributions`` is a sequence of ``(field, distribution)`` pairs for the
+    inputs that vary. Each chunk gets its own generator spawned from ``seed``,
+    so a given (seed, chunk_size) always reproduces the same samples.
+
+    Returns a dict with the P5/P50/P95 of both metrics, their means, the
+    probability of loss at the current price and a histogram of utilidad_total.
+    """
+    for _, distribution in distributions:
+        validate(distribution)
+
+    seeds = np.random.SeedSequence(seed).spawn(-(-n_samples // chunk_size))
+    sizes = [min(chunk_size, n_samples - index * chunk_size) for index in range(len(seeds))]
+
+    def chunks():
+        for chunk_seed, size in zip(seeds, sizes):
+            yield _evaluate_chunk(chunk_seed, base_inputs, distributions, size)
+
+    # First pass: ranges, means and losses
+    low, high = np.full(2, np.inf), np.full(2, -np.inf)
+    total = np.zeros(2)
+    perdidas = 0
+    for utilidad_total, costo_por_bolsa in chunks():
+        values = np.stack([utilidad_total, costo_por_bolsa])
+        low = np.minimum(low, values.min(axis=1))
+        high = np.maximum(high, values.max(axis=1))
+        total += values.sum(axis=1)
+        perdidas += int(np.count_nonzero(utilidad_total < 0))
+
+    # Second pass: the same samples again, into histograms over those ranges
+    counts = np.zeros((2, QUANTILE_BINS), dtype=np.int64)
+    histogram = np.zeros(HISTOGRAM_BINS, dtype=np.int64)
+    for utilidad_total, costo_por_bolsa in chunks():
+        for i, values in enumerate((utilidad_total, costo_por_bolsa)):
+            counts[i] += np.histogram(values, bins=QUANTILE_BINS, range=(low[i], high[i]))[0]
+        histogram += np.histogram(utilidad_total, bins=HISTOGRAM_BINS, range=(low[0], high[0]))[0]
+    edges = [np.histogram_bin_edges([], QUANTILE_BINS, range=(low[i], high[i])) for i in range(2)]
+
+    return {
+        'n_samples': n_samples,
+        'utilidad_total': _percentiles(counts[0], edges[0], low[0], high[0]),
+        'costo_por_bolsa': _percentiles(counts[1], edges[1], low[1], high[1]),
+        'utilidad_total_media': float(total[0] / n_samples),
+        'costo_por_bolsa_media': float(total[1] / n_samples),
+        'prob_perdida': perdidas / n_samples,
+        'histograma': (histogram, np.histogram_bin_edges([], HISTOGRAM_BINS, range=(low[0], high[0]))),
+    }
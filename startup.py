@@ -0,0 +1,86 @@
+"""Startup-time measurement for the app's heavy imports.
+
+The app imports numpy, pandas and matplotlib only in the page or section that
+needs them, wrapping each import in timed_imports(). The first import of each
+one in the process is recorded in IMPORT_TIMES. Set VAQUITA_STARTUP_REPORT=1
+to see those timings and the script run times in the sidebar.
+
+Run ``python startup.py`` to measure cold-start costs from fresh
+interpreters: the import time of each heavy module and the first script run
+(first paint) of the app.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+REPORT_ENABLED = os.environ.get('VAQUITA_STARTUP_REPORT') == '1'
+
+# Label -> seconds taken by its first import in this process
+IMPORT_TIMES = {}
+
+# Duration of the first script run in this process, i.e. a new worker's first paint
+FIRST_RUN = None
+
+HEAVY_MODULES = ('streamlit', 'numpy', 'pandas', 'matplotlib.figure', 'calculator', 'database', 'charts')
+
+
+@contextmanager
+def timed_imports(label):
+    """Time the imports in the block, if they load anything new."""
+    loaded = len(sys.modules)
+    start = time.perf_counter()
+    yield
+    if len(sys.modules) > loaded and label not in IMPORT_TIMES:
+        IMPORT_TIMES[label] = time.perf_counter() - start
+
+
+def record_run(seconds):
+    """Remember the duration of the first script run in this process."""
+    global FIRST_RUN
+    if FIRST_RUN is None:
+        FIRST_RUN = seconds
+
+
+def _cold_import(module):
+    code = (
+        "import time; start = time.perf_counter(); "
+        f"import {module}; print(time.perf_counter() - start)"
+    )
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def _cold_first_run():
+    code = (
+        "import time; start = time.perf_counter()\n"
+        "from streamlit.testing.v1 import AppTest\n"
+        "AppTest.from_file('app.py', default_timeout=120).run()\n"
+        "print(time.perf_counter() - start)\n"
+    )
+    # Keep the measured run's autosave draft out of the shipped sessions.db
+    env = dict(os.environ, VAQUITA_SESSIONS_PATH=':memory:')
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True, env=env)
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Medir el arranque en frío de la app.")
+    parser.add_argument('--repeat', type=int, default=3, help="mediciones por módulo (se reporta la mínima)")
+    parser.add_argument('--no-app', action='store_true', help="no medir la primera ejecución de la app")
+    args = parser.parse_args(argv)
+
+    print("Importación en frío (s)")
+    for module in HEAVY_MODULES:
+        best = min(_cold_import(module) for _ in range(args.repeat))
+        print(f"  {module:<24} {best:8.3f}")
+
+    if not args.no_app:
+        best = min(_cold_first_run() for _ in range(args.repeat))
+        print(f"Primera ejecución de la app (s) {best:8.3f}")
+
+
+if __name__ == '__main__':
+    main()